@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+オフライン再分析モジュール
+保存済みの応答から値を再抽出し、統計情報を再計算する（API呼び出しなし）
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config_store import DATA_DIR
+from report_generator import generate_html_report
+from storage import read_json, read_json_layout, write_json
+from task_types import get_task_type
+
+# 抽出に使う parser_options を読む設定ファイル
+DEFAULT_CONFIG_FILE = str(DATA_DIR / "config.json")
+
+
+def task_parser_options(config: Dict[str, Any], override: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    タスク名ごとの parser_options を設定から集める
+
+    Args:
+        config: 実験設定
+        override: すべてのタスクで上書きするオプション（--rules など）
+
+    Returns:
+        タスク名 -> parser_options
+    """
+    return {
+        task["name"]: {**(task.get("parser_options") or {}), **(override or {})}
+        for task in config.get("tasks", [])
+    }
+
+
+def reanalyze(results: List[Dict[str, Any]], parser_options: Optional[Dict[str, Any]] = None, task_options: Optional[Dict[str, Dict[str, Any]]] = None, show_changes: bool = False) -> int:
+    """
+    保存済みの応答から extracted_value と statistics を再計算する
+
+    全結果のランを一度だけ走査してタスクタイプごとに抽出し、
+    その後セルごとに統計を集計する。
+
+    Args:
+        results: 実験結果のリスト（その場で更新される）
+        parser_options: task_options にないタスクで使うオプション（省略時はデフォルト）
+        task_options: タスク名 -> パーサに渡すオプション（task_parser_options で作る）
+        show_changes: extracted_value が変化したランを表示する
+
+    Returns:
+        extracted_value が変化したランの数
+    """
+    task_options = task_options or {}
+    changed = 0
+    cell_values = defaultdict(list)
+    for index, result in enumerate(results):
+        task_def = get_task_type(result["task_type"])
+        options = task_options.get(result["task_name"], parser_options)
+        for run in result.get("runs", []):
+            if run.get("chunks"):
+                # コンテンツを分割したランはチャンクごとに抽出してまとめる
+                for chunk in run["chunks"]:
+                    chunk["extracted_value"] = task_def.parse(chunk["response"], options) if chunk["success"] else None
+                values = [chunk["extracted_value"] for chunk in run["chunks"]]
+                value = task_def.combine(values) if run.get("success") else None
+            else:
+                value = task_def.parse(run.get("response"), options) if run.get("success") else None
+            if run.get("extracted_value") != value:
+                changed += 1
+                if show_changes:
+                    print(f"  {result['task_name']} / {result['tone_pattern']} #{run.get('run_number')}: {run.get('extracted_value')} → {value}")
+            run["extracted_value"] = value
+            if value is not None:
+                cell_values[index].append(value)
+
+    for index, result in enumerate(results):
+        task_def = get_task_type(result["task_type"])
+        result["statistics"] = task_def.aggregator(cell_values[index])
+
+    return changed
+
+
+def analyze(
+    filenames: List[str],
+    html_file: Optional[str] = "docs/index.html",
+    parser_options: Optional[Dict[str, Any]] = None,
+    write: bool = True,
+    task_options: Optional[Dict[str, Dict[str, Any]]] = None,
+    show_changes: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    結果ファイルを再分析し、結果ファイルとHTMLレポートを更新する
+
+    Args:
+        filenames: 結果ファイルのパスのリスト
+        html_file: HTMLレポートの保存先（Noneなら生成しない）
+        parser_options: task_options にないタスクで使うオプション
+        write: 結果ファイルを上書きするかどうか
+        task_options: タスク名 -> パーサに渡すオプション
+        show_changes: extracted_value が変化したランを表示する
+
+    Returns:
+        全ファイルの結果を結合したリスト
+    """
+    all_results = []
+    models = []
+    tasks = []
+    tone_patterns = {}
+    cost_summaries = []
+
+    for filename in filenames:
+        # 書き戻すときは元のファイルと同じ形式（compact_output）にする
+        data, compact = read_json_layout(filename)
+        changed = reanalyze(data["results"], parser_options, task_options, show_changes)
+        print(f"{filename}: {len(data['results'])} セルを再分析しました（抽出値の変化: {changed} 件）")
+
+        info = data["experiment_info"]
+        info["reanalysis_date"] = datetime.now().isoformat()
+        if write:
+            write_json(filename, data, compact)
+            print(f"結果を {filename} に保存しました")
+
+        all_results.extend(data["results"])
+        if info["model"] not in models:
+            models.append(info["model"])
+        tasks.extend(name for name in info["tasks"] if name not in tasks)
+        tone_patterns.update({pattern: pattern for pattern in info["tone_patterns"]})
+        if info.get("cost"):
+            cost_summaries.append(info["cost"])
+
+    if html_file:
+        config = {
+            "model": ", ".join(models),
+            "tasks": [{"name": name} for name in tasks]
+        }
+        cost_summary = cost_summaries[0] if len(cost_summaries) == 1 and len(filenames) == 1 else None
+        generate_html_report(all_results, config, tone_patterns, html_file, cost_summary)
+
+    return all_results
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description="保存済みの応答から統計情報を再計算する")
+    parser.add_argument("files", nargs="*", default=["output/results.json"], help="結果ファイル")
+    parser.add_argument("--html", default="docs/index.html", help="HTMLレポートの保存先")
+    parser.add_argument("--no-html", action="store_true", help="HTMLレポートを生成しない")
+    parser.add_argument("--no-write", action="store_true", help="結果ファイルを上書きしない")
+    parser.add_argument("--show-changes", action="store_true", help="抽出値が変化したランを表示する")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help="タスクごとの parser_options を読む設定ファイル")
+    parser.add_argument("--rules", nargs="+", help="数値抽出のルール（設定の rules を上書きする。例: keyword last）")
+    args = parser.parse_args()
+
+    # 実験と同じ抽出にするため、タスクごとの parser_options を設定から読む
+    parser_options = {"rules": args.rules} if args.rules else None
+    analyze(
+        args.files,
+        html_file=None if args.no_html else args.html,
+        parser_options=parser_options,
+        write=not args.no_write,
+        task_options=task_parser_options(read_json(args.config), parser_options),
+        show_changes=args.show_changes,
+    )
+
+
+if __name__ == "__main__":
+    main()
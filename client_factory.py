@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+OpenAI クライアントの生成モジュール
+接続プール・keep-alive・HTTP/2・タイムアウトを設定した共有クライアントを生成する
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# config.json の "client" のデフォルト値
+DEFAULT_CLIENT_OPTIONS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 60.0,
+    "http2": False,
+    "max_retries": 2,
+    "timeout": {
+        "connect": 10.0,
+        "read": 600.0,
+        "write": 30.0,
+        "pool": 30.0,
+    },
+}
+
+# 同じ設定のクライアントはタスク・モデルをまたいで再利用する
+_CLIENTS: Dict[Any, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+class ClientMetrics:
+    """
+    接続プールの計測値
+
+    httpx の trace 拡張を使い、リクエストごとに
+    接続プールの待ち時間・新規接続の有無・接続確立にかかった時間を記録する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.pool_wait_seconds = 0.0
+        self.max_pool_wait_seconds = 0.0
+        self.connect_seconds = 0.0
+
+    def on_request(self, request: Any):
+        """httpx のリクエストフックとして登録し、trace コールバックを差し込む"""
+        started = time.perf_counter()
+        state = {"waited": False, "connect_started": None}
+
+        def trace(event_name: str, info: Dict[str, Any]):
+            now = time.perf_counter()
+            if not state["waited"] and (event_name.startswith("connection.connect_tcp") or event_name.endswith("send_request_headers.started")):
+                state["waited"] = True
+                self._record_wait(now - started)
+            if event_name == "connection.connect_tcp.started":
+                state["connect_started"] = now
+            elif state["connect_started"] is not None and (
+                event_name == "connection.start_tls.complete"
+                or (event_name == "connection.connect_tcp.complete" and request.url.scheme != "https")
+            ):
+                self._record_connect(now - state["connect_started"])
+                state["connect_started"] = None
+
+        request.extensions = {**request.extensions, "trace": trace}
+        with self._lock:
+            self.requests += 1
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self.pool_wait_seconds += seconds
+            self.max_pool_wait_seconds = max(self.max_pool_wait_seconds, seconds)
+
+    def _record_connect(self, seconds: float):
+        with self._lock:
+            self.new_connections += 1
+            self.connect_seconds += seconds
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        計測値の集計を返す
+
+        Returns:
+            リクエスト数・新規接続数・接続再利用率・プール待ち時間・接続確立時間
+        """
+        with self._lock:
+            requests = self.requests
+            return {
+                "requests": requests,
+                "new_connections": self.new_connections,
+                "connection_reuse_rate": (1 - self.new_connections / requests) if requests else None,
+                "pool_wait_seconds_total": self.pool_wait_seconds,
+                "pool_wait_seconds_mean": self.pool_wait_seconds / requests if requests else None,
+                "pool_wait_seconds_max": self.max_pool_wait_seconds,
+                "connect_seconds_total": self.connect_seconds,
+            }
+
+
+def _options_key(api_key: str, options: Dict[str, Any]) -> Any:
+    timeout = options["timeout"]
+    return (
+        api_key,
+        options["max_connections"],
+        options["max_keepalive_connections"],
+        options["keepalive_expiry"],
+        options["http2"],
+        options["max_retries"],
+        tuple(sorted(timeout.items())),
+    )
+
+
+def resolve_client_options(options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    クライアント設定にデフォルト値を補う
+
+    Args:
+        options: クライアント設定（config.json の "client"）
+
+    Returns:
+        すべての項目を含むクライアント設定
+    """
+    options = options or {}
+    resolved = {**DEFAULT_CLIENT_OPTIONS, **options}
+    resolved["timeout"] = {**DEFAULT_CLIENT_OPTIONS["timeout"], **options.get("timeout", {})}
+    return resolved
+
+
+def create_client(api_key: str, options: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    共有の OpenAI クライアントを取得する（同じ設定なら同じインスタンスを返す）
+
+    Args:
+        api_key: OpenAI APIキー
+        options: クライアント設定（config.json の "client"）
+
+    Returns:
+        OpenAI クライアント（client.metrics に ClientMetrics が設定される）
+    """
+    options = resolve_client_options(options)
+    key = _options_key(api_key, options)
+    with _CLIENTS_LOCK:
+        if key in _CLIENTS:
+            return _CLIENTS[key]
+
+        import httpx
+        from openai import OpenAI
+
+        metrics = ClientMetrics()
+        limits = httpx.Limits(
+            max_connections=options["max_connections"],
+            max_keepalive_connections=options["max_keepalive_connections"],
+            keepalive_expiry=options["keepalive_expiry"],
+        )
+        timeout = httpx.Timeout(**options["timeout"])
+        http2 = options["http2"]
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("警告: h2 パッケージがないため HTTP/1.1 で接続します（pip install 'httpx[http2]'）")
+                http2 = False
+
+        http_client = httpx.Client(
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+            event_hooks={"request": [metrics.on_request]},
+        )
+        client = OpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=options["max_retries"],
+        )
+        client.metrics = metrics
+        _CLIENTS[key] = client
+        return client
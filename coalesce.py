@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+リクエストの重複排除モジュール
+同一のリクエストが実行中なら、新しく呼び出さずに同じ結果を待つ
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Optional, Tuple
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+# 再利用のために保持する完了済みの結果の最大数（古いものから捨てる）
+DEFAULT_MAX_COMPLETED = 4096
+
+
+def request_key(model: str, prompt: str, params: Optional[Dict[str, Any]] = None, slot: int = 0) -> Tuple[Hashable, ...]:
+    """
+    重複判定に使うキーを作る
+
+    Args:
+        model: モデル名
+        prompt: プロンプト
+        params: その他のリクエストパラメータ
+        slot: サンプル番号（同じプロンプトでも番号が違えば別のサンプルとして扱う）
+
+    Returns:
+        キー
+    """
+    return (model, prompt, json.dumps(params or {}, sort_keys=True), slot)
+
+
+class RequestCoalescer:
+    """
+    同一リクエストの合流と重複排除
+
+    同じキーのリクエストが実行中なら後続の呼び出しはその Future を待ち、
+    完了済みで成功していればその結果を再利用する（失敗した結果は再利用しない）。
+    完了済みの結果は最近使った max_completed 件だけを保持する。
+    """
+
+    def __init__(self, is_success: Callable[[Any], bool] = lambda result: True, max_completed: int = DEFAULT_MAX_COMPLETED):
+        """
+        Args:
+            is_success: 結果を再利用してよいかを判定する関数
+            max_completed: 再利用のために保持する完了済みの結果の最大数
+        """
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, "Future"] = {}
+        self._completed: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._max_completed = max_completed
+        self._is_success = is_success
+        self.requests = 0
+        self.coalesced = 0
+        self.reused = 0
+
+    def call(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        キーに対応するリクエストを実行する（実行中・完了済みなら合流する）
+
+        Args:
+            key: request_key で作ったキー
+            fn: 実際にリクエストを送る関数
+
+        Returns:
+            (結果, 合流したかどうか)
+        """
+        with self._lock:
+            self.requests += 1
+            if key in self._completed:
+                self.reused += 1
+                self._completed.move_to_end(key)
+                return self._completed[key], True
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                from concurrent.futures import Future
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if not owner:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if self._is_success(result):
+                self._completed[key] = result
+                if len(self._completed) > self._max_completed:
+                    self._completed.popitem(last=False)
+        future.set_result(result)
+        return result, False
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        重複排除の集計を返す
+
+        Returns:
+            リクエスト数・実行中への合流数・完了済みの再利用数・ヒット率
+        """
+        with self._lock:
+            hits = self.coalesced + self.reused
+            return {
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "reused": self.reused,
+                "hit_rate": hits / self.requests if self.requests else None,
+            }
+
+
+def merge_dedup_summaries(previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    以前の実行の重複排除の集計に今回の集計を加える
+
+    Args:
+        previous: 既存の結果ファイルの experiment_info.dedup（なければNone）
+        current: 今回の RequestCoalescer.summary()（重複排除しなければNone）
+
+    Returns:
+        足し合わせた集計
+    """
+    if not previous or not current:
+        return current or previous
+    merged = {key: previous.get(key, 0) + current[key] for key in ("requests", "coalesced", "reused")}
+    hits = merged["coalesced"] + merged["reused"]
+    merged["hit_rate"] = hits / merged["requests"] if merged["requests"] else None
+    return merged
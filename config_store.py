@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+設定の検証とデータファイルの読み込みモジュール
+config.json と tone_patterns.json をスキーマで検証し、参照するファイルを一度だけ読み込んでハッシュを記録する
+"""
+
+import hashlib
+import threading
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+
+from cost import get_price
+from number_parser import RULES
+from scheduler import ORDERS
+from task_types import get_task_type
+
+DATA_DIR = Path(__file__).parent / "data"
+
+_NUMBER = {"type": "number", "minimum": 0}
+_POSITIVE_INTEGER = {"type": "integer", "minimum": 1}
+
+# config.json のスキーマ（JSON Schema のサブセット）
+CONFIG_SCHEMA = {
+    "type": "object",
+    "required": ["model", "runs_per_task", "tasks"],
+    "additionalProperties": False,
+    "properties": {
+        "model": {"type": "string"},
+        "runs_per_task": _POSITIVE_INTEGER,
+        "output_file": {"type": "string"},
+        "html_report_file": {"type": "string"},
+        "compact_output": {"type": "boolean"},
+        "concurrency": _POSITIVE_INTEGER,
+        "dedup": {"type": "boolean"},
+        "tasks": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["name", "type", "content_type", "content"],
+                "additionalProperties": False,
+                "properties": {
+                    "name": {"type": "string"},
+                    "type": {"type": "string"},
+                    "content_type": {"enum": ["file", "text"]},
+                    "content": {"type": "string"},
+                    "parser_options": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {
+                            "rules": {"type": "array", "minItems": 1, "items": {"enum": list(RULES)}},
+                            "keywords": {"type": "array", "items": {"type": "string"}},
+                        },
+                    },
+                },
+            },
+        },
+        "schedule": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "order": {"enum": list(ORDERS)},
+                "seed": {"type": ["integer", "null"]},
+                "tokens_per_minute": _POSITIVE_INTEGER,
+            },
+        },
+        "budget": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "max_usd": _NUMBER,
+                "throttle_usd": _NUMBER,
+                "throttle_seconds": _NUMBER,
+                "expected_output_tokens": _POSITIVE_INTEGER,
+            },
+        },
+        "prices": {
+            "type": "object",
+            "additionalProperties": {"type": "array", "minItems": 2, "maxItems": 2, "items": _NUMBER},
+        },
+        "preflight": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "context_tokens": _POSITIVE_INTEGER,
+                "reserve_output_tokens": {"type": "integer", "minimum": 0},
+                "on_oversize": {"enum": ["reject", "chunk"]},
+            },
+        },
+        "client": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "max_connections": _POSITIVE_INTEGER,
+                "max_keepalive_connections": {"type": "integer", "minimum": 0},
+                "keepalive_expiry": _NUMBER,
+                "http2": {"type": "boolean"},
+                "max_retries": {"type": "integer", "minimum": 0},
+                "timeout": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {"connect": _NUMBER, "read": _NUMBER, "write": _NUMBER, "pool": _NUMBER},
+                },
+            },
+        },
+        "progress": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "dashboard": {"type": "boolean"},
+                "http_port": {"type": "integer", "minimum": 0},
+                "interval_seconds": _NUMBER,
+            },
+        },
+        "queue": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "path": {"type": "string"},
+                "lease_seconds": _NUMBER,
+                "poll_seconds": _NUMBER,
+                "idle_timeout_seconds": _NUMBER,
+                "max_attempts": _POSITIVE_INTEGER,
+                "deadline_seconds": _NUMBER,
+            },
+        },
+    },
+}
+
+# tone_patterns.json のスキーマ
+TONE_PATTERNS_SCHEMA = {
+    "type": "object",
+    "minProperties": 1,
+    "additionalProperties": {"type": "string"},
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+class ConfigError(ValueError):
+    """設定ファイルの内容が不正"""
+
+
+def _is_type(value: Any, name: str) -> bool:
+    # bool は int のサブクラスなので数値としては扱わない
+    if name == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, _TYPES[name])
+
+
+def validate_schema(value: Any, schema: Dict[str, Any], path: str = "") -> List[str]:
+    """
+    値をスキーマで検証する
+
+    type / enum / required / properties / additionalProperties / minProperties /
+    items / minItems / maxItems / minimum に対応する。
+
+    Args:
+        value: 検証する値
+        schema: スキーマ
+        path: エラーメッセージに使う位置
+
+    Returns:
+        エラーメッセージのリスト（問題がなければ空）
+    """
+    where = path or "(ルート)"
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{where}: {value!r} は {', '.join(map(str, schema['enum']))} のいずれかである必要があります"]
+    if "type" in schema:
+        types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        if not any(_is_type(value, name) for name in types):
+            return [f"{where}: {' / '.join(types)} である必要があります（{type(value).__name__} が指定されています）"]
+
+    errors = []
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{where}: {key} がありません")
+        if len(value) < schema.get("minProperties", 0):
+            errors.append(f"{where}: {schema['minProperties']} 項目以上必要です")
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", True)
+        for key, item in value.items():
+            item_path = f"{path}.{key}" if path else key
+            if key in properties:
+                errors.extend(validate_schema(item, properties[key], item_path))
+            elif additional is False:
+                errors.append(f"{item_path}: 不明な項目です")
+            elif isinstance(additional, dict):
+                errors.extend(validate_schema(item, additional, item_path))
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{where}: {schema['minItems']} 件以上必要です")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{where}: {schema['maxItems']} 件以下である必要があります")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate_schema(item, schema["items"], f"{where}[{i}]"))
+    elif "minimum" in schema and value < schema["minimum"]:
+        errors.append(f"{where}: {schema['minimum']} 以上である必要があります")
+    return errors
+
+
+class AssetStore:
+    """
+    データファイルの読み込みキャッシュ
+
+    各ファイルは最初に参照されたときに一度だけ読み込まれ、内容とSHA-256が記録される。
+    記録した内容は書き換えられない（読み取り専用のビューのみ公開する）。
+    """
+
+    def __init__(self, base_dir: Path):
+        """
+        Args:
+            base_dir: データファイルのディレクトリ
+        """
+        self.base_dir = Path(base_dir)
+        self._lock = threading.Lock()
+        self._texts: Dict[str, str] = {}
+        self._hashes: Dict[str, str] = {}
+
+    def text(self, name: str) -> str:
+        """
+        ファイルの内容を返す（初回のみ読み込む）
+
+        Args:
+            name: base_dir からの相対パス
+
+        Returns:
+            ファイルの内容
+
+        Raises:
+            FileNotFoundError: ファイルが存在しない場合
+        """
+        with self._lock:
+            if name not in self._texts:
+                data = (self.base_dir / name).read_bytes()
+                self._texts[name] = data.decode("utf-8")
+                self._hashes[name] = hashlib.sha256(data).hexdigest()
+            return self._texts[name]
+
+    def hash(self, name: str) -> str:
+        """ファイルの内容のSHA-256を返す（初回のみ読み込む）"""
+        self.text(name)
+        return self._hashes[name]
+
+    @property
+    def hashes(self) -> Mapping[str, str]:
+        """読み込み済みのファイル名 -> SHA-256"""
+        with self._lock:
+            return MappingProxyType(dict(self._hashes))
+
+
+@lru_cache(maxsize=None)
+def get_asset_store(base_dir: Path = DATA_DIR) -> AssetStore:
+    """ディレクトリごとに共有の AssetStore を返す"""
+    return AssetStore(base_dir)
+
+
+def content_hash(text: str) -> str:
+    """文字列のSHA-256"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compile_config(config: Dict[str, Any], tone_patterns: Optional[Dict[str, str]] = None, store: Optional[AssetStore] = None) -> Dict[str, Any]:
+    """
+    設定を検証し、参照するファイルをすべて読み込む（API呼び出しの前に失敗させる）
+
+    スキーマの検証に加えて、タスクタイプの登録・タスク名の重複・ファイルの存在・
+    モデルの料金を確認する。エラーはまとめて報告する。
+
+    Args:
+        config: 実験設定
+        tone_patterns: 口調パターン（省略時は検証しない）
+        store: データファイルの読み込みキャッシュ
+
+    Returns:
+        content_hashes（ファイルとタスクのコンテンツのSHA-256）
+
+    Raises:
+        ConfigError: 設定に問題がある場合
+    """
+    store = store or get_asset_store()
+    errors = validate_schema(config, CONFIG_SCHEMA)
+    if tone_patterns is not None:
+        errors.extend(f"tone_patterns.json: {error}" for error in validate_schema(tone_patterns, TONE_PATTERNS_SCHEMA))
+
+    # スキーマの誤りがあっても、検証できるタスクは続けて確認する
+    tasks = config.get("tasks") if isinstance(config, dict) else None
+    names = set()
+    for i, task in enumerate(tasks if isinstance(tasks, list) else []):
+        where = f"tasks[{i}]"
+        if not isinstance(task, dict) or not all(isinstance(task.get(key), str) for key in ("name", "type", "content_type", "content")):
+            continue
+        try:
+            get_task_type(task["type"])
+        except ValueError as e:
+            errors.append(f"{where}.type: {e}")
+        if task["name"] in names:
+            errors.append(f"{where}.name: タスク名 {task['name']} が重複しています")
+        names.add(task["name"])
+        if task["content_type"] == "file":
+            try:
+                store.text(task["content"])
+            except (OSError, UnicodeDecodeError) as e:
+                errors.append(f"{where}.content: {task['content']} を読み込めません（{e}）")
+
+    if isinstance(config, dict) and isinstance(config.get("model"), str) and not any(error.startswith("prices") for error in errors):
+        try:
+            get_price(config["model"], config.get("prices"))
+        except ValueError as e:
+            errors.append(f"model: {e}")
+
+    if errors:
+        raise ConfigError("設定にエラーがあります:\n  " + "\n  ".join(errors))
+    return content_hashes(config, store)
+
+
+def content_hashes(config: Dict[str, Any], store: Optional[AssetStore] = None) -> Dict[str, Any]:
+    """
+    実験に使ったファイルとタスクのコンテンツのハッシュを返す（experiment_info に記録する）
+
+    Args:
+        config: 実験設定
+        store: データファイルの読み込みキャッシュ
+
+    Returns:
+        files（読み込んだファイル名 -> SHA-256）と tasks（タスク名 -> コンテンツのSHA-256）
+    """
+    store = store or get_asset_store()
+    tasks = {}
+    for task in config["tasks"]:
+        if task["content_type"] == "file":
+            tasks[task["name"]] = store.hash(task["content"])
+        else:
+            tasks[task["name"]] = content_hash(task["content"])
+    return {"files": dict(store.hashes), "tasks": tasks}
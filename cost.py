@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+コスト・トークン集計モジュール
+実験全体のコストを事前に見積もり、実行中の支出を集計して上限を監視する
+"""
+
+import math
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+# モデルごとの料金（USD / 100万トークン）: (入力, 出力)
+# config.json の "prices" で上書き・追加できる
+PRICES = {
+    "gpt-4": (30.00, 60.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-5": (1.25, 10.00),
+    "gpt-5.1": (1.25, 10.00),
+    "gpt-5-mini": (0.25, 2.00),
+}
+
+# 見積もりで使う1回あたりの出力トークン数のデフォルト
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 100
+
+
+class BudgetExceededError(RuntimeError):
+    """支出が設定された上限を超えた"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を概算する
+
+    ASCII文字は約4文字で1トークン、それ以外（日本語など）は1文字あたり約0.75トークンとして数える。
+
+    Args:
+        text: 対象のテキスト
+
+    Returns:
+        概算トークン数
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) * 0.75)
+
+
+def get_price(model: str, prices: Optional[Dict[str, Any]] = None) -> tuple:
+    """
+    モデルの料金を取得する
+
+    Args:
+        model: モデル名
+        prices: 料金表の上書き（{"model": [入力, 出力]}）
+
+    Returns:
+        (入力, 出力) のUSD / 100万トークン
+
+    Raises:
+        ValueError: 料金表にないモデルの場合
+    """
+    table = dict(PRICES)
+    table.update({name: tuple(price) for name, price in (prices or {}).items()})
+    if model in table:
+        return table[model]
+    # 日付付きのモデル名（例: gpt-4o-2024-08-06）は最長一致で探す
+    for name in sorted(table, key=len, reverse=True):
+        if model.startswith(name + "-"):
+            return table[name]
+    raise ValueError(f"料金表にないモデルです: {model}（config.json の prices で指定してください）")
+
+
+def usage_cost(usage: Optional[Dict[str, Any]], price: tuple) -> float:
+    """
+    usage からコストを計算する
+
+    Args:
+        usage: prompt_tokens / completion_tokens を含む辞書
+        price: (入力, 出力) のUSD / 100万トークン
+
+    Returns:
+        コスト（USD）
+    """
+    if not usage:
+        return 0.0
+    return (usage.get("prompt_tokens", 0) * price[0] + usage.get("completion_tokens", 0) * price[1]) / 1_000_000
+
+
+def project_sweep_cost(cells: List[Dict[str, Any]], price: tuple, expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS) -> Dict[str, Any]:
+    """
+    実験全体のコストを見積もる
+
+    Args:
+        cells: task_name, tone_pattern, input_tokens, run_numbers を含むセルのリスト
+            （chunks があるセルはランごとにチャンクの数だけ呼び出す）
+        price: (入力, 出力) のUSD / 100万トークン
+        expected_output_tokens: 1回あたりの想定出力トークン数
+
+    Returns:
+        見積もり（呼び出し回数・トークン数・コスト）
+    """
+    calls = sum(len(cell["run_numbers"]) * len(cell.get("chunks") or [cell]) for cell in cells)
+    input_tokens = sum(cell["input_tokens"] * len(cell["run_numbers"]) for cell in cells)
+    output_tokens = calls * expected_output_tokens
+    return {
+        "calls": calls,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": usage_cost({"prompt_tokens": input_tokens, "completion_tokens": output_tokens}, price),
+    }
+
+
+class CostTracker:
+    """
+    実行中の支出を集計し、上限を監視する
+
+    budget の設定項目:
+        max_usd: これを超えたら中断する
+        throttle_usd: これを超えたら呼び出しごとに throttle_seconds 待機する
+        throttle_seconds: スロットル時の待機秒数
+        expected_output_tokens: 見積もりで使う1回あたりの出力トークン数
+    """
+
+    def __init__(self, model: str, budget: Optional[Dict[str, Any]] = None, prices: Optional[Dict[str, Any]] = None, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            model: モデル名
+            budget: 予算設定（config.json の "budget"）
+            prices: 料金表の上書き（config.json の "prices"）
+            sleep: 待機関数
+        """
+        budget = budget or {}
+        self.model = model
+        self.price = get_price(model, prices)
+        self.max_usd = budget.get("max_usd")
+        self.throttle_usd = budget.get("throttle_usd")
+        self.throttle_seconds = budget.get("throttle_seconds", 5.0)
+        self.expected_output_tokens = budget.get("expected_output_tokens", DEFAULT_EXPECTED_OUTPUT_TOKENS)
+        self.projection = None
+        self.total_usd = 0.0
+        self._sleep = sleep
+        self._cells = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+
+    def project(self, cells: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        実験全体のコストを見積もり、上限を超える場合は開始前に中断する
+
+        Args:
+            cells: task_name, tone_pattern, input_tokens, run_numbers を含むセルのリスト
+
+        Returns:
+            見積もり
+
+        Raises:
+            BudgetExceededError: 見積もりが max_usd を超える場合
+        """
+        self.projection = project_sweep_cost(cells, self.price, self.expected_output_tokens)
+        if self.max_usd is not None and self.projection["cost_usd"] > self.max_usd:
+            raise BudgetExceededError(
+                f"見積もりコスト ${self.projection['cost_usd']:.4f} が上限 ${self.max_usd:.4f} を超えています"
+            )
+        return self.projection
+
+    def record(self, task_name: str, tone_pattern: str, usage: Optional[Dict[str, Any]]) -> float:
+        """
+        1回の呼び出しの使用量を記録する
+
+        Args:
+            task_name: タスク名
+            tone_pattern: 口調パターン
+            usage: API呼び出しの usage
+
+        Returns:
+            この呼び出しのコスト（USD）
+        """
+        usage = usage or {}
+        return self.record_tokens(task_name, tone_pattern, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    def record_tokens(self, task_name: str, tone_pattern: str, input_tokens: int, output_tokens: int, calls: int = 1) -> float:
+        """
+        呼び出しのトークン数を記録する
+
+        Args:
+            task_name: タスク名
+            tone_pattern: 口調パターン
+            input_tokens: 入力トークン数
+            output_tokens: 出力トークン数
+            calls: 呼び出し回数（チャンクに分割したランは複数回）
+
+        Returns:
+            この呼び出しのコスト（USD）
+        """
+        cost = (input_tokens * self.price[0] + output_tokens * self.price[1]) / 1_000_000
+        cell = self._cells[(task_name, tone_pattern)]
+        cell["calls"] += calls
+        cell["input_tokens"] += input_tokens
+        cell["output_tokens"] += output_tokens
+        cell["cost_usd"] += cost
+        self.total_usd += cost
+        return cost
+
+    @property
+    def exceeded(self) -> bool:
+        """支出が max_usd を超えたかどうか"""
+        return self.max_usd is not None and self.total_usd >= self.max_usd
+
+    def throttle(self):
+        """支出が throttle_usd を超えていれば待機する"""
+        if self.throttle_usd is not None and self.total_usd >= self.throttle_usd:
+            self._sleep(self.throttle_seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        集計結果を返す
+
+        Returns:
+            合計・タスク別・口調別・セル別のコストとトークン数
+        """
+        by_task = defaultdict(float)
+        by_tone = defaultdict(float)
+        cells = []
+        for (task_name, tone_pattern), cell in self._cells.items():
+            by_task[task_name] += cell["cost_usd"]
+            by_tone[tone_pattern] += cell["cost_usd"]
+            cells.append({"task_name": task_name, "tone_pattern": tone_pattern, **cell})
+        return {
+            "model": self.model,
+            "price_per_million_tokens": {"input": self.price[0], "output": self.price[1]},
+            "projected": self.projection,
+            "total_usd": self.total_usd,
+            "input_tokens": sum(cell["input_tokens"] for cell in cells),
+            "output_tokens": sum(cell["output_tokens"] for cell in cells),
+            "by_task": dict(by_task),
+            "by_tone": dict(by_tone),
+            "cells": cells,
+        }
+
+
+def merge_cost_summaries(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    以前の実行の集計に今回の集計を加える（差分実行で実験全体の支出を記録するため）
+
+    Args:
+        previous: 既存の結果ファイルの experiment_info.cost（なければNone）
+        current: 今回の CostTracker.summary()
+
+    Returns:
+        合計・タスク別・口調別・セル別を足し合わせた集計（料金は今回のもの）
+    """
+    if not previous:
+        return current
+    by_task = defaultdict(float, previous.get("by_task", {}))
+    by_tone = defaultdict(float, previous.get("by_tone", {}))
+    for name, cost in current["by_task"].items():
+        by_task[name] += cost
+    for name, cost in current["by_tone"].items():
+        by_tone[name] += cost
+
+    cells = {(cell["task_name"], cell["tone_pattern"]): dict(cell) for cell in previous.get("cells", [])}
+    for cell in current["cells"]:
+        merged = cells.setdefault((cell["task_name"], cell["tone_pattern"]), {"task_name": cell["task_name"], "tone_pattern": cell["tone_pattern"], "calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0})
+        for key in ("calls", "input_tokens", "output_tokens", "cost_usd"):
+            merged[key] += cell[key]
+
+    projected = current["projected"]
+    if previous.get("projected") and projected:
+        projected = {key: previous["projected"][key] + projected[key] for key in projected}
+
+    return {
+        **current,
+        "projected": projected,
+        "total_usd": previous.get("total_usd", 0.0) + current["total_usd"],
+        "input_tokens": previous.get("input_tokens", 0) + current["input_tokens"],
+        "output_tokens": previous.get("output_tokens", 0) + current["output_tokens"],
+        "by_task": dict(by_task),
+        "by_tone": dict(by_tone),
+        "cells": list(cells.values()),
+    }
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+分散実行モジュール
+コーディネータがランをワークキューに投入し、複数のワーカーがリースして実行する
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from coalesce import RequestCoalescer
+from cost import get_price, usage_cost
+from prompt_experiment import build_cell_result, chunk_prompts, execute_run, extension_info, load_existing_results, plan_and_project, print_run, save_results
+from records import RunRecord
+from scheduler import rate_limiter, resolve_schedule, schedule_runs
+from work_queue import SQLiteWorkQueue, WorkQueue
+
+# config.json の "queue" のデフォルト値
+DEFAULT_QUEUE_OPTIONS = {
+    "path": "output/queue.sqlite3",
+    "lease_seconds": 120,
+    "poll_seconds": 2.0,
+    "idle_timeout_seconds": 60,
+    "max_attempts": 3,
+    "deadline_seconds": None,
+}
+
+
+def queue_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """config.json の "queue" にデフォルト値を補う"""
+    return {**DEFAULT_QUEUE_OPTIONS, **config.get("queue", {})}
+
+
+def open_queue(config: Dict[str, Any], path: Optional[str] = None) -> WorkQueue:
+    """
+    ワークキューを開く
+
+    Args:
+        config: 実験設定
+        path: キューのパス（省略時は config.json の "queue.path"）
+
+    Returns:
+        WorkQueue
+    """
+    return SQLiteWorkQueue(path or queue_options(config)["path"])
+
+
+def build_payloads(cells: List[Dict[str, Any]], model: str, schedule: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    セルをラン単位のペイロードに展開する
+
+    キューは投入順にリースされるので、ペイロードはスケジュールの順に並べる。
+
+    Args:
+        cells: plan_cells が返すセルのリスト
+        model: 使用するモデル名
+        schedule: 実行順の設定（省略時はセルごとに続けて実行する）
+
+    Returns:
+        ペイロードのリスト（実行順）
+    """
+    schedule = schedule or {"order": "sequential", "seed": None}
+    payloads = []
+    for dispatch_index, (cell_index, run_number) in enumerate(schedule_runs(cells, schedule)):
+        cell = cells[cell_index]
+        payloads.append({
+            "key": f"{cell_index}:{run_number}",
+            "cell_index": cell_index,
+            "run_number": run_number,
+            "dispatch_index": dispatch_index,
+            "task_name": cell["task_name"],
+            "task_type": cell["task_type"],
+            "tone_pattern": cell["tone_pattern"],
+            "prompt": cell["prompt"],
+            "model": model,
+            "parser_options": cell["task"].get("parser_options"),
+            "chunks": chunk_prompts(cell),
+            "input_tokens": cell["input_tokens"],
+        })
+    return payloads
+
+
+def sweep_id_for(payloads: List[Dict[str, Any]]) -> str:
+    """
+    ペイロードから決定的なスイープIDを作る（同じ計画なら再起動しても同じIDになる）
+
+    実行順はIDに含めないので、シードを変えて再起動しても投入済みのランを引き継ぐ。
+    """
+    runs = sorted(({k: v for k, v in payload.items() if k != "dispatch_index"} for payload in payloads), key=lambda payload: payload["key"])
+    digest = hashlib.sha256(json.dumps(runs, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def coordinate(config: Dict[str, Any], tone_patterns: Dict[str, str], queue: WorkQueue, extend: bool = False) -> List[Dict[str, Any]]:
+    """
+    コーディネータとしてランを投入し、全ランの完了を待って結果を保存する
+
+    同じ計画で再起動した場合は投入済みのランを再投入せず、完了済みの結果を引き継ぐ。
+    全ランが完了または失敗（max_attempts 回リースしても完了しない）するか、支出が上限に達するか、
+    deadline_seconds が過ぎたら待つのをやめ、そこまでの結果を保存する。
+
+    Args:
+        config: 実験設定
+        tone_patterns: 口調パターン
+        queue: ワークキュー
+        extend: 既存の結果ファイルにないランだけを投入してマージする
+
+    Returns:
+        実験結果のリスト
+    """
+    from report_generator import generate_html_report
+
+    options = queue_options(config)
+    model = config["model"]
+    output_file = config.get("output_file", "output/results.json")
+    existing = load_existing_results(output_file) if extend else None
+    cells, cost_tracker, delta = plan_and_project(config, tone_patterns, existing)
+    schedule = resolve_schedule(config.get("schedule"))
+    payloads = build_payloads(cells, model, schedule)
+    sweep_id = sweep_id_for(payloads)
+
+    added = queue.enqueue(sweep_id, payloads)
+    # ワーカーはこのスイープだけをリースし、以前の計画の未処理のランは実行しない
+    cancelled = queue.activate(sweep_id, config.get("budget"), options["max_attempts"])
+    print(f"スイープ {sweep_id}: {added} / {len(payloads)} ランを投入しました")
+    if cancelled:
+        print(f"  以前のスイープの未処理のラン {cancelled} 件を取り消しました")
+
+    # 全ランの完了を待つ（支出が上限に達したら、実行中のランの完了を待って打ち切る）
+    stop_reason = None
+    deadline = None if options["deadline_seconds"] is None else time.monotonic() + options["deadline_seconds"]
+    while True:
+        queue.reap(sweep_id)
+        counts = queue.counts(sweep_id)
+        print(f"  完了 {counts['done']}/{len(payloads)} (実行中 {counts['leased']}, 待ち {counts['pending']}, リース切れ {counts['expired']}, 失敗 {counts['failed']})")
+        if counts["pending"] + counts["leased"] + counts["expired"] == 0:
+            break
+        sweep = queue.sweep(sweep_id)
+        if sweep["max_usd"] is not None and sweep["spent_usd"] >= sweep["max_usd"] and counts["leased"] == 0:
+            stop_reason = f"支出が上限 ${sweep['max_usd']:.4f} に達した"
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            stop_reason = f"{options['deadline_seconds']} 秒が過ぎた"
+            break
+        time.sleep(options["poll_seconds"])
+    queue.finish(sweep_id)
+    failed = queue.counts(sweep_id)["failed"]
+    if failed:
+        print(f"\n{options['max_attempts']} 回リースしても完了しなかったラン {failed} 件を失敗として扱いました")
+    if stop_reason:
+        print(f"\n{stop_reason}ため実験を中断しました")
+
+    # ワーカーの結果をセルごとにまとめる
+    cell_runs = defaultdict(list)
+    workers = set()
+    for payload, result in queue.results(sweep_id):
+        run = RunRecord.from_dict(result["run"])
+        cell_runs[payload["cell_index"]].append(run)
+        workers.add(result["worker_id"])
+        if not run.coalesced and run.usage is not None:
+            cost_tracker.record_tokens(payload["task_name"], payload["tone_pattern"], run.usage.prompt_tokens, run.usage.completion_tokens, run.calls())
+
+    results = []
+    for cell_index, cell in enumerate(cells):
+        runs = sorted(cell_runs[cell_index], key=lambda run: run.run_number)
+        if runs or cell.get("existing") is not None:
+            results.append(build_cell_result(cell, runs, model).to_dict())
+    if delta is not None:
+        results += delta["orphans"]
+
+    cost_summary = cost_tracker.summary()
+    print(f"実際の支出: ${cost_summary['total_usd']:.4f}")
+
+    info = extension_info(existing, delta, {
+        "cost": cost_summary,
+        "distributed": {"sweep_id": sweep_id, "workers": sorted(workers), "failed_runs": failed},
+        "schedule": schedule,
+    })
+    save_results(results, config, tone_patterns, output_file, info)
+
+    html_file = config.get("html_report_file", "docs/index.html")
+    generate_html_report(results, config, tone_patterns, html_file, info["cost"])
+    return results
+
+
+class _LeaseKeeper:
+    """実行中のランのリースを期限の1/3ごとに延長する（呼び出しが長引いても再発行されないようにする）"""
+
+    def __init__(self, queue: WorkQueue, item_id: int, worker_id: str, lease_seconds: float):
+        self.queue = queue
+        self.item_id = item_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _renew(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            if not self.queue.renew(self.item_id, self.worker_id, self.lease_seconds):
+                return
+
+
+def work(config: Dict[str, Any], queue: WorkQueue, worker_id: Optional[str] = None) -> int:
+    """
+    ワーカーとしてランをリースして実行する
+
+    コーディネータが実行中にしたスイープのランだけをリースする。
+    参加したスイープの未完了のランがなくなるか終了したら、
+    またはキューが idle_timeout_seconds の間空のままなら終了する。
+    リースの前にスイープの支出を確認し、上限に達していればリースしない。
+    config.json の schedule.tokens_per_minute はワーカーごとに適用する。
+
+    Args:
+        config: 実験設定（client と prices の設定に使う）
+        queue: ワークキュー
+        worker_id: ワーカーID（省略時はホスト名とPID）
+
+    Returns:
+        実行したランの数
+    """
+    from client_factory import create_client
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY 環境変数が設定されていません")
+    client = create_client(api_key, config.get("client"))
+    coalescer = RequestCoalescer(lambda api_result: api_result["success"]) if config.get("dedup", True) else None
+    limiter = rate_limiter(config.get("schedule") or {})
+
+    options = queue_options(config)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    executed = 0
+    idle_since = time.monotonic()
+    # 参加中のスイープと、そのスイープに未完了のランがあるのを見たかどうか
+    # （完了済みのまま残った古いスイープを見てすぐに終了しないようにする）
+    joined = None
+    live = False
+
+    while True:
+        sweep = queue.active_sweep()
+        item = None
+        if sweep is not None:
+            if sweep["sweep_id"] != joined:
+                joined, live = sweep["sweep_id"], False
+                # 重複排除の結果はスイープをまたいで保持しない
+                if coalescer is not None:
+                    coalescer = RequestCoalescer(lambda api_result: api_result["success"])
+            if sweep["throttle_usd"] is not None and sweep["spent_usd"] >= sweep["throttle_usd"]:
+                # throttle_seconds: 0 は待たない（CostTracker と同じ）
+                time.sleep(sweep["throttle_seconds"] if sweep["throttle_seconds"] is not None else 5.0)
+            item = queue.lease(worker_id, options["lease_seconds"], sweep["sweep_id"])
+
+        if item is None:
+            if joined is not None:
+                counts = queue.counts(joined)
+                unfinished = counts["pending"] + counts["leased"] + counts["expired"]
+                live = live or unfinished > 0
+                if live and (unfinished == 0 or sweep is None or sweep["sweep_id"] != joined):
+                    break
+            if time.monotonic() - idle_since > options["idle_timeout_seconds"]:
+                break
+            # 他のワーカーのリースが切れたら再発行されるので待つ
+            time.sleep(options["poll_seconds"])
+            continue
+
+        live = True
+        item_id, payload = item
+        with _LeaseKeeper(queue, item_id, worker_id, options["lease_seconds"]):
+            if limiter is not None:
+                limiter.acquire(payload.get("input_tokens", 0))
+            run = execute_run(client, payload["prompt"], payload["model"], payload["run_number"], payload["task_type"], payload["parser_options"], coalescer, payload.get("dispatch_index"), payload.get("chunks"))
+        print_run(run, f"  [{worker_id}] {payload['task_name']} / {payload['tone_pattern']} #{payload['run_number']}... ")
+
+        # 合流したランは呼び出しを共有しているので支出に数えない
+        cost_usd = 0.0
+        if not run.coalesced and run.usage is not None:
+            cost_usd = usage_cost(run.usage.to_dict(), get_price(payload["model"], config.get("prices")))
+        if not queue.complete(item_id, worker_id, {"worker_id": worker_id, "run": run.to_dict()}, cost_usd):
+            print(f"  [{worker_id}] リースが切れていたため結果を破棄しました")
+        executed += 1
+        idle_since = time.monotonic()
+
+    print(f"ワーカー {worker_id}: {executed} ランを実行しました")
+    return executed
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+インクリメンタル実行モジュール
+既存の結果ファイルと計画を比較し、足りないランだけを実行して結果にマージする
+"""
+
+from typing import Any, Dict, List, Tuple
+
+from records import CellResult
+
+
+def cell_key(task_name: str, tone_pattern: str) -> Tuple[str, str]:
+    """既存の結果とセルを対応付けるキー"""
+    return (task_name, tone_pattern)
+
+
+def plan_delta(cells: List[Dict[str, Any]], existing_results: List[Dict[str, Any]], model: str) -> Dict[str, Any]:
+    """
+    計画したセルと既存の結果を比較し、各セルで実行するラン番号を絞り込む
+
+    成功したランは再実行せず、失敗したランと足りないランだけを実行する。
+    プロンプトかモデルが変わったセルは既存のランを使わず、全ランを実行し直す。
+
+    Args:
+        cells: plan_cells が返すセルのリスト（run_numbers と existing を更新する）
+        existing_results: 既存の結果ファイルの results
+        model: 使用するモデル名
+
+    Returns:
+        reused_runs（再利用するラン数）, new_runs（実行するラン数）,
+        stale_cells（実行し直すセル）, orphans（計画にない既存の結果）
+    """
+    existing = {cell_key(result["task_name"], result["tone_pattern"]): result for result in existing_results}
+    planned = set()
+    reused_runs = 0
+    new_runs = 0
+    stale_cells = []
+
+    for cell in cells:
+        key = cell_key(cell["task_name"], cell["tone_pattern"])
+        planned.add(key)
+        result = existing.get(key)
+        if result is None:
+            new_runs += len(cell["run_numbers"])
+            continue
+        if result["prompt"] != cell["prompt"] or result.get("model", model) != model:
+            stale_cells.append(f"{cell['task_name']} / {cell['tone_pattern']}")
+            new_runs += len(cell["run_numbers"])
+            continue
+
+        previous = CellResult.from_dict(result)
+        # 成功したランだけを残し、計画より多いランはそのまま残す
+        kept = [run for run in previous.runs if run.success]
+        done = {run.run_number for run in kept}
+        cell["existing"] = CellResult(
+            previous.task_name,
+            previous.task_type,
+            previous.tone_pattern,
+            previous.prompt,
+            kept,
+            previous.timestamp,
+            previous.model,
+            previous.statistics,
+        )
+        cell["run_numbers"] = [number for number in cell["run_numbers"] if number not in done]
+        reused_runs += len(kept)
+        new_runs += len(cell["run_numbers"])
+
+    orphans = [result for key, result in existing.items() if key not in planned]
+    return {"reused_runs": reused_runs, "new_runs": new_runs, "stale_cells": stale_cells, "orphans": orphans}
+
+
+def print_delta(delta: Dict[str, Any]):
+    """差分の計画を表示する"""
+    print(f"差分: 既存 {delta['reused_runs']} ランを再利用、{delta['new_runs']} ランを追加実行")
+    for name in delta["stale_cells"]:
+        print(f"  {name}: プロンプトまたはモデルが変わったため実行し直します")
+    if delta["orphans"]:
+        print(f"  計画にない既存の結果 {len(delta['orphans'])} セルはそのまま残します")
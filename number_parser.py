@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+数値回答パーサ
+全角数字・漢数字を含む応答テキストから回答の数値を抽出する
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+# 全角数字・全角記号を半角に変換するテーブル
+_FULLWIDTH_TABLE = str.maketrans("０１２３４５６７８９，－", "0123456789,-")
+
+_KANJI_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_KANJI_UNITS = {"十": 10, "百": 100, "千": 1000}
+_KANJI_LARGE_UNITS = {"万": 10000}
+
+# 数値の直後にあれば個数とみなす助数詞（漢数字はこれが続くものだけを数値とみなす）
+KANJI_COUNTERS = ("つ", "個", "件", "箇所", "か所", "カ所", "ヶ所", "ケ所", "ヵ所")
+
+# 漢数字を含むが数を表さない語（例: 一貫した、十分に、同一箇所）
+KANJI_COMPOUNDS = ("一貫", "十分", "一部", "同一", "万一", "一度", "一般", "一致", "一番", "唯一", "統一", "一方", "一切", "一応", "一緒", "一見", "一様", "一律", "第一")
+
+# 「誤字は一つもありません」のように、数値がなく誤りがないと答えている表現（0 とみなす）
+_NEGATIONS = ("ありません", "ございません", "見当たりません", "見つかりません", "存在しません", "はない", "はなし", "は無い", "は無し")
+
+# 回答の数値の直前に現れやすい語
+DEFAULT_KEYWORDS = ("合計", "総数", "総計", "全部で", "計")
+
+# 数値の選び方（先頭から順に適用し、最初に決まったものを採用する）
+#   only:    数値が1つだけならそれを採用
+#   keyword: キーワード直後の数値を採用
+#   counter: 助数詞（件・箇所・つ・個など）が続く最初の数値を採用（例: 2024年の文章に5件 → 5）
+#   first:   最初の数値を採用
+#   last:    最後の数値を採用
+#   max:     最大の数値を採用
+DEFAULT_RULES = ("only", "keyword", "counter", "first")
+RULES = ("only", "keyword", "counter", "first", "last", "max")
+
+
+def kanji_to_int(text: str) -> Optional[int]:
+    """
+    漢数字を整数に変換する
+
+    Args:
+        text: 漢数字の文字列（例: 十三, 二百五, 一二）
+
+    Returns:
+        変換した整数、または変換できない場合はNone
+    """
+    if not text:
+        return None
+    # 位取りのない並び（例: 一二 → 12）
+    if all(c in _KANJI_DIGITS for c in text):
+        return int("".join(str(_KANJI_DIGITS[c]) for c in text))
+
+    total = 0
+    section = 0
+    digit = None
+    for c in text:
+        if c in _KANJI_DIGITS:
+            if digit is not None:
+                return None
+            digit = _KANJI_DIGITS[c]
+        elif c in _KANJI_UNITS:
+            section += (1 if digit is None else digit) * _KANJI_UNITS[c]
+            digit = None
+        elif c in _KANJI_LARGE_UNITS:
+            section += digit or 0
+            total += (section or 1) * _KANJI_LARGE_UNITS[c]
+            section = 0
+            digit = None
+        else:
+            return None
+    return total + section + (digit or 0)
+
+
+class NumberParser:
+    """
+    コンパイル済みの数値パーサ
+
+    算用数字（全角を含む）を優先し、算用数字が1つもない場合のみ漢数字を候補にする。
+    漢数字は助数詞（つ・個・件・箇所など）が続くものだけを数値とみなし、
+    「一貫」「十分」のような語や「一つ目」は数値として扱わない。
+    「一つも（ありません）」や、数値のない「ありません」は 0 とみなす。
+    """
+
+    def __init__(self, rules: Sequence[str] = DEFAULT_RULES, keywords: Sequence[str] = DEFAULT_KEYWORDS):
+        """
+        Args:
+            rules: 数値の選び方のルール名の並び
+            keywords: keyword ルールで使うキーワード
+        """
+        unknown = [rule for rule in rules if rule not in RULES]
+        if unknown:
+            raise ValueError(f"Unknown number rule: {', '.join(unknown)}")
+        self.rules = tuple(rules)
+        self.keywords = tuple(keywords)
+
+        kanji_chars = "".join(_KANJI_DIGITS) + "".join(_KANJI_UNITS) + "".join(_KANJI_LARGE_UNITS)
+        self._arabic = re.compile(r"\d+(?:,\d{3})*")
+        counters = "|".join(re.escape(c) for c in KANJI_COUNTERS)
+        # 「一つ目」（順序）は個数ではないので除く
+        self._kanji = re.compile(f"[{kanji_chars}]+(?=(?:{counters})(?!目))")
+        self._counter = re.compile(f"(?:{counters})(?!目)")
+        # 「一つもありません」「1件もない」は 0 を表すので、数値の候補にしない
+        self._none = re.compile(f"(?:一|1|ひと)(?:{counters})も")
+        self._negation = re.compile("|".join(re.escape(n) for n in _NEGATIONS))
+        self._compounds = re.compile("|".join(re.escape(c) for c in sorted(KANJI_COMPOUNDS, key=len, reverse=True)))
+        keyword_alt = "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+        self._keyword = re.compile(f"(?:{keyword_alt})" + r"\D{0,4}?$") if keyword_alt else None
+
+    def candidates(self, text: str) -> List[Tuple[int, int, bool]]:
+        """
+        テキスト中の数値候補を抽出する
+
+        Args:
+            text: 全角変換済みのテキスト
+
+        Returns:
+            (出現位置, 数値, 助数詞が続くかどうか) のリスト
+        """
+        # 数を表さない語は位置を変えずに伏せる
+        masked = self._none.sub(_mask, text)
+        found = [
+            (m.start(), int(m.group().replace(",", "")), self._counter.match(masked, m.end()) is not None)
+            for m in self._arabic.finditer(masked)
+        ]
+        if found:
+            return found
+        masked = self._compounds.sub(_mask, masked)
+        for m in self._kanji.finditer(masked):
+            value = kanji_to_int(m.group())
+            if value is not None:
+                found.append((m.start(), value, True))
+        return found
+
+    def parse(self, text: Optional[str]) -> Optional[int]:
+        """
+        テキストから回答の数値を抽出する
+
+        Args:
+            text: レスポンステキスト
+
+        Returns:
+            抽出された数値、または抽出できない場合はNone
+        """
+        if not text:
+            return None
+        text = text.translate(_FULLWIDTH_TABLE)
+        found = self.candidates(text)
+        if not found:
+            # 「誤字は一つもありません」など、誤りがないという回答は 0 として集計する
+            if self._none.search(text) or self._negation.search(text):
+                return 0
+            return None
+
+        for rule in self.rules:
+            if rule == "only":
+                if len(found) == 1:
+                    return found[0][1]
+            elif rule == "keyword":
+                if self._keyword is not None:
+                    for pos, value, _ in found:
+                        if self._keyword.search(text, 0, pos):
+                            return value
+            elif rule == "counter":
+                for _, value, counted in found:
+                    if counted:
+                        return value
+            elif rule == "first":
+                return found[0][1]
+            elif rule == "last":
+                return found[-1][1]
+            elif rule == "max":
+                return max(value for _, value, _ in found)
+        return None
+
+    __call__ = parse
+
+
+def _mask(match: "re.Match") -> str:
+    return "・" * len(match.group())
+
+
+@lru_cache(maxsize=32)
+def get_parser(rules: Tuple[str, ...] = DEFAULT_RULES, keywords: Tuple[str, ...] = DEFAULT_KEYWORDS) -> NumberParser:
+    """
+    ルールごとにコンパイル済みのパーサを取得する
+
+    Args:
+        rules: 数値の選び方のルール名の並び
+        keywords: keyword ルールで使うキーワード
+
+    Returns:
+        NumberParser
+    """
+    return NumberParser(rules, keywords)
+
+
+def extract_number(text: Optional[str], rules: Sequence[str] = DEFAULT_RULES, keywords: Sequence[str] = DEFAULT_KEYWORDS) -> Optional[int]:
+    """
+    テキストから数値を抽出する
+
+    Args:
+        text: レスポンステキスト
+        rules: 数値の選び方のルール名の並び
+        keywords: keyword ルールで使うキーワード
+
+    Returns:
+        抽出された数値、または抽出できない場合はNone
+    """
+    return get_parser(tuple(rules), tuple(keywords)).parse(text)
+
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+プリフライトチェックモジュール
+API呼び出しの前に全プロンプトをローカルでトークン化し、コンテキスト長を検証する
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from cost import estimate_tokens
+from task_types import get_task_type, render_prompt
+
+# モデルごとのコンテキスト長（トークン）
+# config.json の "preflight.context_tokens" で上書きできる
+CONTEXT_TOKENS = {
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+    "gpt-5": 400000,
+    "gpt-5.1": 400000,
+    "gpt-5-mini": 400000,
+}
+
+# 応答用に確保しておくトークン数のデフォルト
+DEFAULT_RESERVE_OUTPUT_TOKENS = 1000
+
+
+class PreflightError(ValueError):
+    """コンテキスト長を超えるプロンプトがある"""
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str) -> Any:
+    """
+    モデルのトークナイザを取得する（モデルごとに一度だけ読み込む）
+
+    tiktoken がインストールされていない場合はNoneを返し、概算で数える。
+
+    Args:
+        model: モデル名
+
+    Returns:
+        tiktoken のエンコーディング、または None
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str) -> int:
+    """
+    テキストのトークン数を数える
+
+    Args:
+        text: 対象のテキスト
+        model: モデル名
+
+    Returns:
+        トークン数
+    """
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def context_limit(model: str, override: Optional[int] = None) -> Optional[int]:
+    """
+    モデルのコンテキスト長を取得する
+
+    Args:
+        model: モデル名
+        override: 設定による上書き
+
+    Returns:
+        コンテキスト長、または不明な場合はNone
+    """
+    if override is not None:
+        return override
+    if model in CONTEXT_TOKENS:
+        return CONTEXT_TOKENS[model]
+    for name in sorted(CONTEXT_TOKENS, key=len, reverse=True):
+        if model.startswith(name + "-"):
+            return CONTEXT_TOKENS[name]
+    return None
+
+
+def split_content(content: str, model: str, max_tokens: int) -> List[str]:
+    """
+    コンテンツを行単位で max_tokens 以下のチャンクに分割する
+
+    Args:
+        content: 分割するテキスト
+        model: モデル名
+        max_tokens: チャンクあたりの最大トークン数
+
+    Returns:
+        チャンクのリスト
+
+    Raises:
+        PreflightError: 1行だけで max_tokens を超える場合
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in content.splitlines():
+        line_tokens = count_tokens(line + "\n", model)
+        if line_tokens > max_tokens:
+            raise PreflightError(f"1行が {line_tokens} トークンあり、チャンクの上限 {max_tokens} を超えています")
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def preflight_cells(cells: List[Dict[str, Any]], model: str, options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    全セルのプロンプトをトークン化し、コンテキスト長を検証する
+
+    各セルの input_tokens をトークナイザの値で更新する。
+    on_oversize が "chunk" の場合、上限を超えるセルにはコンテンツを分割したプロンプト（chunks）を付ける。
+    セルは分割せず、各ランで全チャンクを呼び出して抽出値をまとめる（input_tokens は全チャンクの合計）。
+    分割できるのは splittable なタスクタイプだけで、それ以外は "reject" と同様にエラーにする。
+
+    Args:
+        cells: plan_cells が返すセルのリスト
+        model: モデル名
+        options: プリフライト設定（config.json の "preflight"）
+            context_tokens: コンテキスト長の上書き
+            reserve_output_tokens: 応答用に確保するトークン数
+            on_oversize: "reject"（デフォルト）または "chunk"
+
+    Returns:
+        検証済みのセルのリスト
+
+    Raises:
+        PreflightError: 分割しないで上限を超えるセルがある場合
+    """
+    options = options or {}
+    on_oversize = options.get("on_oversize", "reject")
+    if on_oversize not in ("reject", "chunk"):
+        raise ValueError(f"Unknown preflight.on_oversize: {on_oversize}")
+
+    limit = context_limit(model, options.get("context_tokens"))
+    if limit is not None:
+        limit -= options.get("reserve_output_tokens", DEFAULT_RESERVE_OUTPUT_TOKENS)
+
+    checked = []
+    oversized = []
+    for cell in cells:
+        tokens = count_tokens(cell["prompt"], model)
+        if limit is None or tokens <= limit:
+            checked.append({**cell, "input_tokens": tokens})
+            continue
+        if on_oversize == "reject":
+            oversized.append(f"{cell['task_name']} / {cell['tone_pattern']}: {tokens} トークン")
+            continue
+        if not get_task_type(cell["task_type"]).splittable:
+            # 分割した部分の値をまとめる方法がないタスクは、分割するとタスクの測るものが変わってしまう
+            oversized.append(f"{cell['task_name']} / {cell['tone_pattern']}: {tokens} トークン（{cell['task_type']} は分割できません）")
+            continue
+
+        # コンテンツ以外（口調・指示文）のトークン数を差し引いた分をチャンクの上限にする
+        task = cell["task"]
+        overhead = tokens - count_tokens(task["content"], model)
+        chunks = []
+        for chunk in split_content(task["content"], model, limit - overhead):
+            prompt = render_prompt({**task, "content": chunk}, cell["tone_instruction"])
+            chunks.append({"prompt": prompt, "input_tokens": count_tokens(prompt, model)})
+        # セルはそのままにして、各ランでチャンクごとに呼び出し、抽出値をタスクタイプの combiner でまとめる
+        checked.append({**cell, "chunks": chunks, "input_tokens": sum(chunk["input_tokens"] for chunk in chunks)})
+
+    if oversized:
+        raise PreflightError(
+            f"コンテキスト長の上限 {limit} トークンを超えるプロンプトがあります:\n  " + "\n  ".join(oversized)
+        )
+    return checked
+
+
+def print_preflight_report(cells: List[Dict[str, Any]], model: str):
+    """
+    セルごとの入力トークン数を表示する
+
+    Args:
+        cells: preflight_cells が返すセルのリスト
+        model: モデル名
+    """
+    tokenizer = "tiktoken" if get_tokenizer(model) is not None else "概算"
+    print(f"プリフライト ({model}, {tokenizer}):")
+    for cell in cells:
+        chunks = f"（{len(cell['chunks'])} チャンク）" if cell.get("chunks") else ""
+        print(f"  {cell['task_name']} / {cell['tone_pattern']}: {cell['input_tokens']} トークン{chunks} × {len(cell['run_numbers'])} 回")
+    total = sum(cell["input_tokens"] * len(cell["run_numbers"]) for cell in cells)
+    print(f"  合計入力トークン: {total}")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+進捗表示モジュール
+実行中のスイープの進捗をターミナルとローカルのHTTP（SSE）で配信する
+"""
+
+import hmac
+import json
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+# レイテンシのパーセンタイルは直近のこの件数から計算する
+LATENCY_WINDOW = 10000
+
+
+def percentile(sorted_values: list, q: float) -> Optional[float]:
+    """ソート済みのリストから q パーセンタイル（0-100）を返す"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ProgressTracker:
+    """
+    スイープの進捗の集計
+
+    ランナーから完了したランを受け取り、件数・スループット・レイテンシ・
+    支出・口調ごとの途中統計をスナップショットとして返す。
+    """
+
+    def __init__(self, total_calls: int, cost_tracker: Any = None):
+        """
+        Args:
+            total_calls: 予定している呼び出し回数
+            cost_tracker: 支出を表示する CostTracker（省略可）
+        """
+        self._lock = threading.Lock()
+        self.total_calls = total_calls
+        self.cost_tracker = cost_tracker
+        self.started_at = time.monotonic()
+        self.done = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.stop_requested = False
+        self.finished = False
+        self._finish_callbacks = []
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        # (task_name, tone_pattern) -> [ラン数, 数値の件数, 合計, 最小, 最大]
+        self._cells: Dict[tuple, list] = {}
+
+    def record(self, task_name: str, tone_pattern: str, run: Any):
+        """
+        完了したランを記録する
+
+        Args:
+            task_name: タスク名
+            tone_pattern: 口調パターン
+            run: RunRecord
+        """
+        with self._lock:
+            self.done += 1
+            if not run.success:
+                self.errors += 1
+            if run.coalesced:
+                self.coalesced += 1
+            else:
+                self._latencies.append(run.execution_time_seconds)
+            cell = self._cells.setdefault((task_name, tone_pattern), [0, 0, 0.0, None, None])
+            cell[0] += 1
+            value = run.extracted_value
+            if isinstance(value, (int, float)):
+                cell[1] += 1
+                cell[2] += value
+                cell[3] = value if cell[3] is None else min(cell[3], value)
+                cell[4] = value if cell[4] is None else max(cell[4], value)
+
+    def request_stop(self):
+        """新しい呼び出しを止めるよう要求する（実行中の呼び出しは完了を待つ）"""
+        with self._lock:
+            self.stop_requested = True
+
+    def on_finish(self, callback):
+        """スイープの終了時に呼ぶ関数を登録する"""
+        self._finish_callbacks.append(callback)
+
+    def finish(self):
+        """スイープの終了を記録する（登録された関数を呼び終えてから戻る）"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        for callback in self._finish_callbacks:
+            callback()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        現在の進捗を返す
+
+        Returns:
+            件数・スループット・ETA・レイテンシ・支出・セルごとの途中統計
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            remaining = self.total_calls - self.done
+            latencies = sorted(self._latencies)
+            cells = [
+                {
+                    "task_name": task_name,
+                    "tone_pattern": tone_pattern,
+                    "runs": count,
+                    "values": n,
+                    "mean": total / n if n else None,
+                    "min": low,
+                    "max": high,
+                }
+                for (task_name, tone_pattern), (count, n, total, low, high) in self._cells.items()
+            ]
+            return {
+                "total": self.total_calls,
+                "done": self.done,
+                "errors": self.errors,
+                "error_rate": self.errors / self.done if self.done else 0.0,
+                "coalesced": self.coalesced,
+                "elapsed_seconds": elapsed,
+                "calls_per_second": rate,
+                "eta_seconds": remaining / rate if rate > 0 else None,
+                "latency_seconds": {
+                    "p50": percentile(latencies, 50),
+                    "p90": percentile(latencies, 90),
+                    "p99": percentile(latencies, 99),
+                },
+                "cost_usd": self.cost_tracker.total_usd if self.cost_tracker is not None else None,
+                "stop_requested": self.stop_requested,
+                "finished": self.finished,
+                "cells": cells,
+            }
+
+
+def format_snapshot(snapshot: Dict[str, Any]) -> str:
+    """スナップショットをターミナル表示用の文字列にする"""
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
+
+    eta = snapshot["eta_seconds"]
+    latency = snapshot["latency_seconds"]
+    lines = [
+        f"進捗 {snapshot['done']}/{snapshot['total']}"
+        f"  {snapshot['calls_per_second']:.2f} calls/s"
+        f"  ETA {'-' if eta is None else time.strftime('%H:%M:%S', time.gmtime(eta))}"
+        f"  エラー {snapshot['errors']} ({snapshot['error_rate']:.1%})"
+        + (f"  支出 ${snapshot['cost_usd']:.4f}" if snapshot["cost_usd"] is not None else ""),
+        f"レイテンシ p50 {seconds(latency['p50'])}  p90 {seconds(latency['p90'])}  p99 {seconds(latency['p99'])}",
+    ]
+    for cell in snapshot["cells"]:
+        mean = "-" if cell["mean"] is None else f"{cell['mean']:.2f}"
+        lines.append(f"  {cell['task_name']} / {cell['tone_pattern']}: {cell['runs']} 回  平均 {mean}")
+    return "\n".join(lines)
+
+
+class TerminalDashboard:
+    """ターミナルに進捗を一定間隔で描き直す"""
+
+    def __init__(self, tracker: ProgressTracker, interval: float = 1.0, stream: Any = None):
+        """
+        Args:
+            tracker: 進捗の集計
+            interval: 描き直す間隔（秒）
+            stream: 出力先（省略時は標準出力）
+        """
+        self.tracker = tracker
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._lines = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        # スイープが終わったら、後続の出力を消さないよう最後に一度描いて止まる
+        self.tracker.on_finish(self.stop)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._render()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._render()
+
+    def _render(self):
+        text = format_snapshot(self.tracker.snapshot())
+        # 前回描いた行を消してから描き直す
+        if self._lines:
+            self.stream.write(f"\x1b[{self._lines}F\x1b[J")
+        self.stream.write(text + "\n")
+        self.stream.flush()
+        self._lines = text.count("\n") + 1
+
+
+_PAGE = """<!DOCTYPE html>
+<html lang="ja">
+<head><meta charset="UTF-8"><title>実験の進捗</title></head>
+<body style="font-family: sans-serif;">
+<h1>実験の進捗</h1>
+<pre id="status">接続中...</pre>
+<button onclick="fetch('/stop', {method: 'POST', headers: {'X-Stop-Token': '__STOP_TOKEN__'}})">新しい呼び出しを停止</button>
+<script>
+const source = new EventSource('/events');
+source.onmessage = (e) => {
+    document.getElementById('status').textContent = JSON.stringify(JSON.parse(e.data), null, 2);
+};
+</script>
+</body>
+</html>
+"""
+
+
+class ProgressServer:
+    """
+    進捗を配信するローカルHTTPサーバー
+
+    GET /        進捗ページ
+    GET /status  現在の進捗（JSON）
+    GET /events  進捗のストリーム（Server-Sent Events）
+    POST /stop   新しい呼び出しを停止する（X-Stop-Token ヘッダに stop_token が必要）
+
+    他のサイトのページからの停止を防ぐため、/stop は実行ごとのトークンを要求し、
+    Origin ヘッダがこのサーバー以外のリクエストは拒否する。
+    Host ヘッダがこのサーバーでないリクエスト（DNSリバインディング）はすべて拒否する。
+    """
+
+    def __init__(self, tracker: ProgressTracker, port: int, interval: float = 1.0, host: str = "127.0.0.1"):
+        """
+        Args:
+            tracker: 進捗の集計
+            port: 待ち受けるポート
+            interval: SSE を送る間隔（秒）
+            host: 待ち受けるアドレス
+        """
+        self.tracker = tracker
+        self.interval = interval
+        self.stop_token = secrets.token_urlsafe(16)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def hosts(self) -> set:
+        """受け付ける Host ヘッダ"""
+        host, port = self._server.server_address[:2]
+        return {f"{host}:{port}", f"localhost:{port}"}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get("Host") not in server.hosts:
+                    self._send(403, "text/plain; charset=utf-8", b"forbidden")
+                elif self.path == "/":
+                    page = _PAGE.replace("__STOP_TOKEN__", server.stop_token)
+                    self._send(200, "text/html; charset=utf-8", page.encode("utf-8"))
+                elif self.path == "/status":
+                    body = json.dumps(server.tracker.snapshot(), ensure_ascii=False).encode("utf-8")
+                    self._send(200, "application/json; charset=utf-8", body)
+                elif self.path == "/events":
+                    self._stream()
+                else:
+                    self._send(404, "text/plain; charset=utf-8", b"not found")
+
+            def do_POST(self):
+                if not self._same_origin() or not hmac.compare_digest(self.headers.get("X-Stop-Token", ""), server.stop_token):
+                    self._send(403, "text/plain; charset=utf-8", b"forbidden")
+                elif self.path == "/stop":
+                    server.tracker.request_stop()
+                    self._send(202, "text/plain; charset=utf-8", b"stopping")
+                else:
+                    self._send(404, "text/plain; charset=utf-8", b"not found")
+
+            def _same_origin(self) -> bool:
+                # ブラウザは別のサイトからのリクエストに Origin を付ける（curl などは付けない）
+                origin = self.headers.get("Origin")
+                host = self.headers.get("Host")
+                return host in server.hosts and (origin is None or origin == f"http://{host}")
+
+            def _send(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                try:
+                    while True:
+                        snapshot = server.tracker.snapshot()
+                        data = json.dumps(snapshot, ensure_ascii=False)
+                        self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if snapshot["finished"]:
+                            break
+                        time.sleep(server.interval)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -5,14 +5,27 @@ GPTプロンプト口調実験スクリプト
 """
 
 import os
-import re
+import sys
 import json
-import statistics
+import argparse
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from pathlib import Path
-from openai import OpenAI
-from report_generator import generate_html_report
+from task_types import get_task_type, render_prompt
+from cost import CostTracker, BudgetExceededError, merge_cost_summaries
+from preflight import preflight_cells, print_preflight_report
+from coalesce import RequestCoalescer, merge_dedup_summaries, request_key
+from records import CellResult, RunRecord, Usage
+from scheduler import rate_limiter, resolve_schedule, schedule_runs
+from incremental import plan_delta, print_delta
+from storage import read_json, write_json
+from config_store import compile_config, content_hashes, get_asset_store
+
+# openai / httpx / レポート生成はAPIを呼ぶ経路でのみ読み込む（--dry-run, --report-only の起動を速くするため）
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from progress import ProgressTracker
 
 # データディレクトリのパス
 DATA_DIR = Path(__file__).parent / "data"
@@ -22,45 +35,23 @@ DOCS_DIR = Path(__file__).parent / "docs"
 
 def load_file(filename: str) -> Any:
     """
-    JSONファイルを読み込む
+    データファイルを読み込む（ファイルは一度だけ読み込まれ、以降はキャッシュから返す）
 
     Args:
         filename: ファイル名
 
     Returns:
-        JSONファイルの内容を含む辞書
+        JSONファイルの内容を含む辞書、またはテキストファイルの内容
     """
-
-    file_path = DATA_DIR / filename
-    with open(file_path, "r", encoding="utf-8") as f:
-        if filename.endswith(".json"):
-            return json.load(f)
-        elif filename.endswith(".txt"):
-            return f.read().strip()
-        else:
-            raise ValueError(f"Unsupported file type: {filename}")
-    
-
-
-def extract_number(text: str) -> Optional[int]:
-    """
-    テキストから数値を抽出する
-
-    Args:
-        text: レスポンステキスト
-
-    Returns:
-        抽出された数値、または抽出できない場合はNone
-    """
-    if not text:
-        return None
-    match = re.search(r'\d+', text)
-    if match:
-        return int(match.group())
-    return None
+    if filename.endswith(".json"):
+        return json.loads(get_asset_store(DATA_DIR).text(filename))
+    elif filename.endswith(".txt"):
+        return get_asset_store(DATA_DIR).text(filename).strip()
+    else:
+        raise ValueError(f"Unsupported file type: {filename}")
 
 
-def generate(client: OpenAI, prompt: str, model: str = "gpt-4") -> Dict[str, Any]:
+def generate(client: "OpenAI", prompt: str, model: str = "gpt-4") -> Dict[str, Any]:
     """
     GPT APIを呼び出す
 
@@ -111,106 +102,293 @@ def build_prompt(task: Dict[str, Any], tone_instruction: str) -> str:
     Returns:
         完全なプロンプト文字列
     """
-    task_type = task["type"]
-    content = task["content"]
-
-    if task_type == "typo_detection":
-        return f"{tone_instruction}\n\n次の文章に含まれる誤字・脱字・文法ミスの総数を数えてください。回答は数字のみで出力してください（例: 5）。\n{content}"
-    elif task_type == "question":
-        return f"{tone_instruction}\n\n大喜利です。以下のお題から、面白い回答を1つだけ答えてください。\n{content}"
-    else:
-        raise ValueError(f"Unsupported task type: {task_type}")
+    return render_prompt(task, tone_instruction)
 
 
-def run_experiment(client: OpenAI, config: Dict[str, Any], tone_patterns: Dict[str, str]) -> List[Dict[str, Any]]:
+def plan_cells(config: Dict[str, Any], tone_patterns: Dict[str, str]) -> List[Dict[str, Any]]:
     """
-    実験を実行する
+    タスク×口調のセルを計画する（API呼び出しなし）
+
+    全プロンプトをローカルでトークン化し、コンテキスト長を超えるものがあればここで失敗する。
 
     Args:
-        client: OpenAI クライアント
         config: 実験設定
         tone_patterns: 口調パターン
 
     Returns:
-        実験結果のリスト
+        task, task_name, task_type, tone_pattern, tone_instruction, prompt, runs, run_numbers, input_tokens を含むセルのリスト
     """
-    results = []
-    tasks = config["tasks"]
-    model = config["model"]
+    cells = []
     runs_per_task = config["runs_per_task"]
 
-    for task in tasks:
-        task_name = task["name"]
-        task_type = task["type"]
+    for task in config["tasks"]:
+        task_def = get_task_type(task["type"])
+        # 繰り返し回数はタスクタイプごとに決まる
+        runs = task_def.runs_for(runs_per_task)
 
-        # タスクのコンテンツを読み込み
+        # タスクのコンテンツを読み込み（設定自体は書き換えない）
         if task["content_type"] == "file":
-            task["content"] = load_file(task["content"])
+            task = {**task, "content": load_file(task["content"])}
 
         for tone_key, tone_instruction in tone_patterns.items():
-            # プロンプト構築
             prompt = build_prompt(task, tone_instruction)
-
-            # 複数回実行用のデータ
-            run_results = []
-            extracted_values = []
-
-            # typo_detectionは複数回、それ以外は1回
-            actual_runs = runs_per_task if task_type == "typo_detection" else 1
-
-            for run_num in range(actual_runs):
-                print(f"  実行 {run_num + 1}/{actual_runs}...", end=" ")
-
-                # API呼び出し
-                start_time = datetime.now()
-                api_result = generate(client, prompt, model)
-                end_time = datetime.now()
-
-                if api_result["success"]:
-                    print(f"✓ ({api_result['answer']})")
-                    # 数値を抽出（typo_detectionの場合）
-                    if task_type == "typo_detection":
-                        extracted = extract_number(api_result["answer"])
-                        if extracted is not None:
-                            extracted_values.append(extracted)
-                else:
-                    print(f"✗ エラー: {api_result['error']}")
-
-                run_results.append({
-                    "run_number": run_num + 1,
-                    "response": api_result["answer"],
-                    "response_length": api_result["answer_length"],
-                    "execution_time_seconds": (end_time - start_time).total_seconds(),
-                    "success": api_result["success"],
-                    "extracted_value": extract_number(api_result["answer"]) if api_result["success"] else None,
-                    "usage": api_result.get("usage"),
-                    "error": api_result.get("error")
-                })
-
-            # 統計情報を計算
-            stats = {}
-            if extracted_values:
-                stats["mean"] = statistics.mean(extracted_values)
-                stats["values"] = extracted_values
-                if len(extracted_values) >= 2:
-                    stats["stdev"] = statistics.stdev(extracted_values)
-                    stats["min"] = min(extracted_values)
-                    stats["max"] = max(extracted_values)
-
-            # 結果を記録
-            result = {
-                "task_name": task_name,
-                "task_type": task_type,
+            cells.append({
+                "task": task,
+                "task_name": task["name"],
+                "task_type": task["type"],
                 "tone_pattern": tone_key,
+                "tone_instruction": tone_instruction,
                 "prompt": prompt,
-                "runs": run_results,
-                "runs_count": actual_runs,
-                "timestamp": datetime.now().isoformat(),
-                "model": model,
-                "statistics": stats
+                "runs": runs,
+                # 実行するラン番号（差分実行では既存の結果にないものだけに絞られる）
+                "run_numbers": list(range(1, runs + 1)),
+            })
+
+    return preflight_cells(cells, config["model"], config.get("preflight"))
+
+
+def call_api(client: "OpenAI", prompt: str, model: str, run_number: int, coalescer: Optional[RequestCoalescer] = None) -> tuple:
+    """
+    GPT APIを呼び出す（coalescer があれば同じモデル・プロンプト・ラン番号の呼び出しを1回にまとめる）
+
+    Returns:
+        (generate の結果, 合流したかどうか)
+    """
+    if coalescer is not None:
+        key = request_key(model, prompt, slot=run_number)
+        return coalescer.call(key, lambda: generate(client, prompt, model))
+    return generate(client, prompt, model), False
+
+
+def combine_chunk_results(api_results: List[Dict[str, Any]], coalesced: List[bool]) -> Dict[str, Any]:
+    """
+    チャンクごとの呼び出し結果を1回分のランの結果にまとめる
+
+    応答は [i/n] を付けて連結し、使用量は合流していない呼び出しだけを合計する。
+
+    Args:
+        api_results: チャンクごとの generate の結果
+        coalesced: チャンクごとに合流したかどうか
+
+    Returns:
+        generate と同じ形式の結果（全チャンクが成功した場合のみ成功）
+    """
+    total = len(api_results)
+    answer = "\n\n".join(f"[{i + 1}/{total}] {result['answer'] or ''}" for i, result in enumerate(api_results))
+    usages = [result["usage"] for result, shared in zip(api_results, coalesced) if result.get("usage") and not shared]
+    errors = [result["error"] for result in api_results if not result["success"]]
+    return {
+        "success": not errors,
+        "answer": answer,
+        "answer_length": sum(result["answer_length"] for result in api_results),
+        "usage": {key: sum(usage[key] for usage in usages) for key in ("prompt_tokens", "completion_tokens", "total_tokens")} if usages else None,
+        "error": errors[0] if errors else None,
+    }
+
+
+def execute_run(client: "OpenAI", prompt: str, model: str, run_number: int, task_type: str, parser_options: Optional[Dict[str, Any]] = None, coalescer: Optional[RequestCoalescer] = None, dispatch_index: Optional[int] = None, chunk_prompts: Optional[List[str]] = None) -> RunRecord:
+    """
+    1回分のAPI呼び出しを実行し、ランの記録を作る
+
+    chunk_prompts を指定すると、チャンクごとに順に呼び出して抽出値をタスクタイプの combiner でまとめる。
+
+    Args:
+        client: OpenAI クライアント
+        prompt: 送信するプロンプト
+        model: 使用するモデル名
+        run_number: ラン番号（1始まり）
+        task_type: タスクタイプ名
+        parser_options: パーサに渡すオプション
+        coalescer: 重複排除（同じモデル・プロンプト・ラン番号の呼び出しは1回にまとめる）
+        dispatch_index: スケジュール上の実行順（0始まり）
+        chunk_prompts: コンテンツを分割したプロンプト（preflight の chunk）
+
+    Returns:
+        ランの記録（呼び出し時刻を含む）
+    """
+    task_def = get_task_type(task_type)
+
+    # API呼び出し
+    start_time = datetime.now()
+    calls = [call_api(client, chunk, model, run_number, coalescer) for chunk in (chunk_prompts or [prompt])]
+    end_time = datetime.now()
+
+    # タスクタイプのパーサで値を抽出
+    chunks = None
+    if chunk_prompts is None:
+        api_result, coalesced = calls[0]
+        extracted = task_def.parse(api_result["answer"], parser_options) if api_result["success"] else None
+    else:
+        chunks = [
+            {
+                "response": result["answer"],
+                "success": result["success"],
+                "extracted_value": task_def.parse(result["answer"], parser_options) if result["success"] else None,
+                "coalesced": shared,
             }
+            for result, shared in calls
+        ]
+        api_result = combine_chunk_results([result for result, _ in calls], [shared for _, shared in calls])
+        coalesced = all(chunk["coalesced"] for chunk in chunks)
+        extracted = task_def.combine([chunk["extracted_value"] for chunk in chunks]) if api_result["success"] else None
+
+    return RunRecord(
+        run_number,
+        api_result["answer"],
+        api_result["answer_length"],
+        (end_time - start_time).total_seconds(),
+        api_result["success"],
+        extracted,
+        Usage.from_dict(api_result.get("usage")),
+        api_result.get("error"),
+        coalesced,
+        start_time.isoformat(),
+        dispatch_index,
+        chunks,
+    )
+
+
+def build_cell_result(cell: Dict[str, Any], run_results: List[RunRecord], model: str) -> CellResult:
+    """
+    セルのランから結果を組み立て、統計情報を計算する
+
+    セルに既存の結果（existing）があれば、既存のランに新しいランをマージし、
+    統計情報は既存の統計に新しいランの値だけを加えて更新する。
+
+    Args:
+        cell: task_name, task_type, tone_pattern, prompt を含むセル
+        run_results: ランの記録のリスト
+        model: 使用したモデル名
+
+    Returns:
+        セルの結果
+    """
+    task_def = get_task_type(cell["task_type"])
+    extracted_values = [run.extracted_value for run in run_results if run.extracted_value is not None]
+
+    existing = cell.get("existing")
+    if existing is not None:
+        run_results = sorted(existing.runs + run_results, key=lambda run: run.run_number)
+        statistics = task_def.merge_statistics(existing.statistics, existing.extracted_values(), extracted_values)
+    else:
+        statistics = task_def.aggregator(extracted_values)
+
+    return CellResult(
+        cell["task_name"],
+        cell["task_type"],
+        cell["tone_pattern"],
+        cell["prompt"],
+        run_results,
+        datetime.now().isoformat(),
+        model,
+        statistics,
+    )
+
+
+def print_run(run: RunRecord, prefix: str = ""):
+    """ランの結果を1行で表示する"""
+    mark = "✓ (重複)" if run.coalesced else "✓"
+    if run.success:
+        print(f"{prefix}{mark} ({run.response})")
+    else:
+        print(f"{prefix}✗ エラー: {run.error}")
+
+
+def chunk_prompts(cell: Dict[str, Any]) -> Optional[List[str]]:
+    """コンテンツを分割したセルのチャンクごとのプロンプト（分割していなければNone）"""
+    if not cell.get("chunks"):
+        return None
+    return [chunk["prompt"] for chunk in cell["chunks"]]
+
+
+def run_experiment(client: "OpenAI", config: Dict[str, Any], tone_patterns: Dict[str, str], cost_tracker: Optional[CostTracker] = None, cells: Optional[List[Dict[str, Any]]] = None, coalescer: Optional[RequestCoalescer] = None, progress: Optional["ProgressTracker"] = None, schedule: Optional[Dict[str, Any]] = None) -> List[CellResult]:
+    """
+    実験を実行する
 
-            results.append(result)
+    ランは schedule の順に送る（口調ごとにまとめて送ると時間による変動が口調の差に見えるため）。
+    config.json の "concurrency" 件まで並列に呼び出すが、空きができた時点で次のランを送るので
+    送信順はスケジュールのまま保たれる。
+    支出の上限は新しい呼び出しを送る前に確認し、schedule の tokens_per_minute があれば
+    プリフライトで数えた入力トークン数でペースを決める。
+
+    Args:
+        client: OpenAI クライアント
+        config: 実験設定
+        tone_patterns: 口調パターン
+        cost_tracker: コスト集計（指定すると上限を超えた時点で中断する）
+        cells: 計画済みのセル（省略時は plan_cells で計画する）
+        coalescer: 重複排除（省略時は重複排除しない）
+        progress: 進捗の集計（指定するとランごとの表示の代わりにこちらへ記録し、停止要求で中断する）
+        schedule: 実行順の設定（省略時は config.json の "schedule" から決める）
+
+    Returns:
+        セルの結果のリスト（保存時に to_dict() で既存のJSON形式に変換する）
+    """
+    # concurrent.futures は logging も読み込むので、実行するときだけ読み込む（--dry-run の起動を速くする）
+    from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    model = config["model"]
+    concurrency = config.get("concurrency", 1)
+    stop_reason = None
+
+    if cells is None:
+        cells = plan_cells(config, tone_patterns)
+    if schedule is None:
+        schedule = resolve_schedule(config.get("schedule"))
+
+    limiter = rate_limiter(schedule)
+    cell_runs = defaultdict(list)
+    pending = {}
+
+    def collect(return_when: str):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            cell_index = pending.pop(future)
+            cell = cells[cell_index]
+            run = future.result()
+            if progress is not None:
+                progress.record(cell["task_name"], cell["tone_pattern"], run)
+            else:
+                print_run(run, f"  {cell['task_name']} / {cell['tone_pattern']} 実行 {run.run_number}/{cell['runs']}... ")
+            # 合流したランは呼び出しを共有しているので支出に数えない
+            if cost_tracker is not None and not run.coalesced and run.usage is not None:
+                cost_tracker.record_tokens(cell["task_name"], cell["tone_pattern"], run.usage.prompt_tokens, run.usage.completion_tokens, run.calls())
+            cell_runs[cell_index].append(run)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for dispatch_index, (cell_index, run_number) in enumerate(schedule_runs(cells, schedule)):
+            while len(pending) >= concurrency:
+                collect(FIRST_COMPLETED)
+
+            if progress is not None and progress.stop_requested:
+                stop_reason = "停止が要求された"
+                break
+            if cost_tracker is not None:
+                if cost_tracker.exceeded:
+                    stop_reason = f"支出が上限 ${cost_tracker.max_usd:.4f} に達した"
+                    break
+                cost_tracker.throttle()
+
+            cell = cells[cell_index]
+            if limiter is not None:
+                limiter.acquire(cell["input_tokens"])
+            future = pool.submit(execute_run, client, cell["prompt"], model, run_number, cell["task_type"], cell["task"].get("parser_options"), coalescer, dispatch_index, chunk_prompts(cell))
+            pending[future] = cell_index
+        if pending:
+            collect(ALL_COMPLETED)
+
+    if progress is not None:
+        progress.finish()
+
+    # 結果を記録（中断したセルは実行済みのランのみ、差分実行では既存のランとマージ）
+    results = []
+    for cell_index, cell in enumerate(cells):
+        if cell_runs[cell_index] or cell.get("existing") is not None:
+            runs = sorted(cell_runs[cell_index], key=lambda run: run.run_number)
+            results.append(build_cell_result(cell, runs, model))
+
+    if stop_reason:
+        print(f"\n{stop_reason}ため実験を中断しました")
 
     print("\n" + "=" * 60)
     print("実験が完了しました")
@@ -218,15 +396,19 @@ def run_experiment(client: OpenAI, config: Dict[str, Any], tone_patterns: Dict[s
     return results
 
 
-def save_results(results: List[Dict[str, Any]], config: Dict[str, Any], tone_patterns: Dict[str, str], filename: str = "output/results.json"):
+def save_results(results: List[Dict[str, Any]], config: Dict[str, Any], tone_patterns: Dict[str, str], filename: str = "output/results.json", extra_info: Optional[Dict[str, Any]] = None):
     """
     結果をJSONファイルに保存
 
+    一時ファイルに書いてから置き換えるので、書き込み途中で落ちても既存の結果は壊れない。
+    filename が .gz / .zst なら圧縮し、config.json の "compact_output" が true ならインデントなしで保存する。
+
     Args:
         results: 実験結果のリスト
         config: 実験設定
         tone_patterns: 口調パターン
         filename: 保存先ファイル名
+        extra_info: experiment_info に追加する情報（cost, client_metrics など）
     """
     output = {
         "experiment_info": {
@@ -238,45 +420,270 @@ def save_results(results: List[Dict[str, Any]], config: Dict[str, Any], tone_pat
         },
         "results": results
     }
+    # 入力ファイルとタスクのコンテンツのハッシュ（キャッシュや再開のキーに使える）
+    output["experiment_info"]["content_hashes"] = content_hashes(config, get_asset_store(DATA_DIR))
+    if extra_info:
+        output["experiment_info"].update(extra_info)
 
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    write_json(filename, output, config.get("compact_output", False))
 
     print(f"\n結果を {filename} に保存しました")
 
 
-def main():
+def load_existing_results(filename: str) -> Optional[Dict[str, Any]]:
+    """
+    差分実行のために既存の結果ファイルを読み込む
+
+    Args:
+        filename: 結果ファイルのパス
+
+    Returns:
+        結果ファイルの内容（存在しなければ None）
+    """
+    if not os.path.exists(filename):
+        print(f"{filename} がないため、全ランを実行します")
+        return None
+    return read_json(filename)
+
+
+def plan_and_project(config: Dict[str, Any], tone_patterns: Dict[str, str], existing: Optional[Dict[str, Any]] = None) -> tuple:
+    """
+    設定を検証してセルを計画し、プリフライトとコスト見積もりを表示する（API呼び出しなし）
+
+    設定の誤りはすべてここで検出し、API呼び出しの前に中断する。
+
+    Args:
+        config: 実験設定
+        tone_patterns: 口調パターン
+        existing: 既存の結果ファイルの内容（指定すると足りないランだけを計画する）
+
+    Returns:
+        (セルのリスト, CostTracker, 差分の計画または None)
+    """
+    compile_config(config, tone_patterns, get_asset_store(DATA_DIR))
+    cells = plan_cells(config, tone_patterns)
+    delta = None
+    if existing is not None:
+        delta = plan_delta(cells, existing["results"], config["model"])
+        print_delta(delta)
+    print_preflight_report(cells, config["model"])
+    cost_tracker = CostTracker(config["model"], config.get("budget"), config.get("prices"))
+    projection = cost_tracker.project(cells)
+    print(f"見積もり: {projection['calls']} 回の呼び出し、約 ${projection['cost_usd']:.4f}")
+    return cells, cost_tracker, delta
+
+
+def extension_info(existing: Optional[Dict[str, Any]], delta: Optional[Dict[str, Any]], info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    差分実行の場合は experiment_info に記録する情報を既存の結果と合わせる
+
+    cost と dedup は以前の実行の集計に今回の分を加えた実験全体の値にし、
+    実行ごとの支出・重複排除・実行順は extension.sweeps に残す。
+
+    Args:
+        existing: 既存の結果ファイルの内容
+        delta: plan_delta が返す差分の計画
+        info: 今回の実行の情報（cost, dedup, schedule など）
+
+    Returns:
+        experiment_info に追加する情報（差分実行でなければ info のまま）
+    """
+    if delta is None:
+        return info
+    previous = existing["experiment_info"]
+    # 最初の差分実行では、既存の結果ファイル自体を1回目の実行として記録する
+    sweeps = previous.get("extension", {}).get("sweeps") or [sweep_entry(previous)]
+    merged = {
+        **info,
+        "cost": merge_cost_summaries(previous.get("cost"), info["cost"]),
+        "extension": {
+            "previous_execution_date": previous.get("execution_date"),
+            "reused_runs": delta["reused_runs"],
+            "new_runs": delta["new_runs"],
+            "stale_cells": delta["stale_cells"],
+            "sweeps": sweeps + [sweep_entry({**info, "execution_date": datetime.now().isoformat()})],
+        },
+    }
+    if "dedup" in info:
+        merged["dedup"] = merge_dedup_summaries(previous.get("dedup"), info["dedup"])
+    return merged
+
+
+def sweep_entry(info: Dict[str, Any]) -> Dict[str, Any]:
+    """1回の実行の支出・重複排除・実行順を extension.sweeps の形にする"""
+    cost = info.get("cost") or {}
+    return {
+        "execution_date": info.get("execution_date"),
+        "cost_usd": cost.get("total_usd"),
+        "calls": sum(cell["calls"] for cell in cost.get("cells", [])),
+        "dedup": info.get("dedup"),
+        "schedule": info.get("schedule"),
+    }
+
+
+def start_progress(config: Dict[str, Any], total_calls: int, cost_tracker: Optional[CostTracker] = None) -> tuple:
+    """
+    設定に応じてターミナルの進捗表示と進捗配信サーバーを開始する
+
+    config.json の "progress":
+        dashboard: ターミナルに進捗を描き直す（省略時は標準出力が端末なら有効）
+        http_port: 進捗を配信するポート（省略時は配信しない）
+        interval_seconds: 更新間隔
+
+    Args:
+        config: 実験設定
+        total_calls: 予定している呼び出し回数
+        cost_tracker: 支出を表示する CostTracker
+
+    Returns:
+        (ProgressTracker または None, 停止する関数)
+    """
+    options = config.get("progress", {})
+    dashboard = options.get("dashboard", sys.stdout.isatty())
+    http_port = options.get("http_port")
+    if not dashboard and http_port is None:
+        return None, lambda: None
+
+    from progress import ProgressServer, ProgressTracker, TerminalDashboard
+
+    interval = options.get("interval_seconds", 1.0)
+    tracker = ProgressTracker(total_calls, cost_tracker)
+    surfaces = []
+    if http_port is not None:
+        server = ProgressServer(tracker, http_port, interval)
+        server.start()
+        print(f"進捗: {server.url}")
+        print(f"停止: curl -X POST -H 'X-Stop-Token: {server.stop_token}' {server.url}stop")
+        surfaces.append(server)
+    if dashboard:
+        terminal = TerminalDashboard(tracker, interval)
+        terminal.start()
+        surfaces.append(terminal)
+
+    def stop():
+        tracker.finish()
+        for surface in reversed(surfaces):
+            surface.stop()
+
+    return tracker, stop
+
+
+def run(config: Dict[str, Any], tone_patterns: Dict[str, str], extend: bool = False):
+    """
+    実験を実行し、結果とHTMLレポートを保存する
+
+    Args:
+        config: 実験設定
+        tone_patterns: 口調パターン
+        extend: 既存の結果ファイルにない（または失敗した）ランだけを実行してマージする
+    """
+    from client_factory import create_client
+    from report_generator import generate_html_report
+
+    # OpenAI クライアントの初期化
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY 環境変数が設定されていません")
+    client = create_client(api_key, config.get("client"))
+
+    # コスト見積もり（上限を超える場合はここで中断）
+    output_file = config.get("output_file", "output/results.json")
+    existing = load_existing_results(output_file) if extend else None
+    cells, cost_tracker, delta = plan_and_project(config, tone_patterns, existing)
+
+    # 実行順の決定（シードは結果に記録して再現できるようにする）
+    schedule = resolve_schedule(config.get("schedule"))
+    print(f"実行順: {schedule['order']}" + (f" (seed={schedule['seed']})" if schedule["seed"] is not None else ""))
+
+    # 進捗表示の開始
+    # 進捗はラン単位で数える（チャンクに分割したランも1件）
+    progress, stop_progress = start_progress(config, sum(len(cell["run_numbers"]) for cell in cells), cost_tracker)
+
+    # 実験実行
+    coalescer = RequestCoalescer(lambda api_result: api_result["success"]) if config.get("dedup", True) else None
+    try:
+        results = [result.to_dict() for result in run_experiment(client, config, tone_patterns, cost_tracker, cells, coalescer, progress, schedule)]
+    finally:
+        stop_progress()
+    if delta is not None:
+        results += delta["orphans"]
+    cost_summary = cost_tracker.summary()
+    print(f"実際の支出: ${cost_summary['total_usd']:.4f}")
+    dedup_summary = coalescer.summary() if coalescer is not None else None
+    if dedup_summary and dedup_summary["requests"]:
+        print(f"重複排除: {dedup_summary['coalesced'] + dedup_summary['reused']}/{dedup_summary['requests']} 件（ヒット率 {dedup_summary['hit_rate']:.1%}）")
+    client_metrics = client.metrics.summary()
+    print(f"接続: {client_metrics['requests']} リクエスト / 新規接続 {client_metrics['new_connections']} / プール待ち最大 {client_metrics['pool_wait_seconds_max']:.3f}s")
+
+    # 結果保存
+    info = extension_info(existing, delta, {
+        "cost": cost_summary,
+        "client_metrics": client_metrics,
+        "dedup": dedup_summary,
+        "schedule": schedule,
+    })
+    save_results(results, config, tone_patterns, output_file, info)
+
+    # HTMLレポート生成（差分実行では以前の実行を含めた支出を表示する）
+    html_file = config.get("html_report_file", "docs/index.html")
+    generate_html_report(results, config, tone_patterns, html_file, info["cost"])
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析する"""
+    parser = argparse.ArgumentParser(description="GPTプロンプト口調実験")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="API を呼ばずにプリフライトとコスト見積もりのみ行う")
+    mode.add_argument("--report-only", action="store_true", help="既存の結果ファイルからHTMLレポートのみ再生成する")
+    mode.add_argument("--coordinator", action="store_true", help="ランをワークキューに投入し、ワーカーの結果をまとめて保存する")
+    mode.add_argument("--worker", action="store_true", help="ワークキューからランをリースして実行する")
+    parser.add_argument("--extend", action="store_true", help="既存の結果ファイルにないランだけを実行してマージする")
+    parser.add_argument("--queue", help="ワークキューのパス（省略時は config.json の queue.path）")
+    parser.add_argument("--worker-id", help="ワーカーID（省略時はホスト名とPID）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """メイン関数"""
+    args = parse_args(argv)
     try:
         # 出力ディレクトリの作成
         OUTPUT_DIR.mkdir(exist_ok=True)
         DOCS_DIR.mkdir(exist_ok=True)
 
-        # OpenAI クライアントの初期化
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY 環境変数が設定されていません")
-        client = OpenAI(api_key=api_key)
-
         # 設定の読み込み
         config = load_file("config.json")
+        output_file = config.get("output_file", "output/results.json")
+        html_file = config.get("html_report_file", "docs/index.html")
+
+        if args.report_only:
+            from report_generator import generate_report_from_file
+            generate_report_from_file(output_file, html_file)
+            return
+
+        if args.worker:
+            from distributed import open_queue, work
+            compile_config(config, store=get_asset_store(DATA_DIR))
+            work(config, open_queue(config, args.queue), args.worker_id)
+            return
+
         tone_patterns = load_file("tone_patterns.json")
 
-        # 実験実行
-        results = run_experiment(client, config, tone_patterns)
+        if args.coordinator:
+            from distributed import coordinate, open_queue
+            coordinate(config, tone_patterns, open_queue(config, args.queue), args.extend)
+            return
 
-        # 結果保存
-        output_file = config.get("output_file", "output/results.json")
-        save_results(results, config, tone_patterns, output_file)
+        if args.dry_run:
+            plan_and_project(config, tone_patterns, load_existing_results(output_file) if args.extend else None)
+            return
 
-        # HTMLレポート生成
-        html_file = config.get("html_report_file", "docs/index.html")
-        generate_html_report(results, config, tone_patterns, html_file)
+        run(config, tone_patterns, args.extend)
 
     except FileNotFoundError as e:
         print(f"\nエラー: 必要なファイルが見つかりません: {e}")
         print("data/ ディレクトリに必要なファイルが存在するか確認してください")
-    except ValueError as e:
+    except (ValueError, BudgetExceededError) as e:
         print(f"\nエラー: {e}")
     except Exception as e:
         print(f"\n予期しないエラーが発生しました: {e}")
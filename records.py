@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+実験記録のデータ構造
+ランとセルの結果を __slots__ 付きのクラスで保持し、保存時に既存のJSON形式へ変換する
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+class Usage:
+    """1回の呼び出しのトークン使用量"""
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int, total_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["Usage"]:
+        if not data:
+            return None
+        return cls(data.get("prompt_tokens", 0), data.get("completion_tokens", 0), data.get("total_tokens", 0))
+
+
+class RunRecord:
+    """1回分のランの記録"""
+
+    __slots__ = (
+        "run_number",
+        "response",
+        "response_length",
+        "execution_time_seconds",
+        "success",
+        "extracted_value",
+        "usage",
+        "error",
+        "coalesced",
+        "dispatched_at",
+        "dispatch_index",
+        "chunks",
+    )
+
+    def __init__(
+        self,
+        run_number: int,
+        response: Optional[str],
+        response_length: int,
+        execution_time_seconds: float,
+        success: bool,
+        extracted_value: Any = None,
+        usage: Optional[Usage] = None,
+        error: Optional[str] = None,
+        coalesced: bool = False,
+        dispatched_at: Optional[str] = None,
+        dispatch_index: Optional[int] = None,
+        chunks: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.run_number = run_number
+        self.response = response
+        self.response_length = response_length
+        self.execution_time_seconds = execution_time_seconds
+        self.success = success
+        self.extracted_value = extracted_value
+        self.usage = usage
+        self.error = error
+        self.coalesced = coalesced
+        self.dispatched_at = dispatched_at
+        self.dispatch_index = dispatch_index
+        # コンテンツを分割したセルのチャンクごとの応答（response, success, extracted_value, coalesced）
+        self.chunks = chunks
+
+    def calls(self) -> int:
+        """支出に数える呼び出しの回数（合流した呼び出しは数えない）"""
+        if self.chunks is None:
+            return 0 if self.coalesced else 1
+        return sum(1 for chunk in self.chunks if not chunk["coalesced"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """results.json の runs[*] の形式に変換する"""
+        return {
+            "run_number": self.run_number,
+            "response": self.response,
+            "response_length": self.response_length,
+            "execution_time_seconds": self.execution_time_seconds,
+            "success": self.success,
+            "extracted_value": self.extracted_value,
+            "usage": self.usage.to_dict() if self.usage is not None else None,
+            "error": self.error,
+            "coalesced": self.coalesced,
+            "dispatched_at": self.dispatched_at,
+            "dispatch_index": self.dispatch_index,
+            "chunks": self.chunks
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunRecord":
+        """results.json の runs[*] の形式から復元する"""
+        return cls(
+            data["run_number"],
+            data.get("response"),
+            data.get("response_length", 0),
+            data.get("execution_time_seconds", 0.0),
+            data.get("success", False),
+            data.get("extracted_value"),
+            Usage.from_dict(data.get("usage")),
+            data.get("error"),
+            data.get("coalesced", False),
+            data.get("dispatched_at"),
+            data.get("dispatch_index"),
+            data.get("chunks"),
+        )
+
+
+class CellResult:
+    """タスク×口調の1セルの結果"""
+
+    __slots__ = ("task_name", "task_type", "tone_pattern", "prompt", "runs", "timestamp", "model", "statistics")
+
+    def __init__(
+        self,
+        task_name: str,
+        task_type: str,
+        tone_pattern: str,
+        prompt: str,
+        runs: List[RunRecord],
+        timestamp: str,
+        model: str,
+        statistics: Dict[str, Any],
+    ):
+        self.task_name = task_name
+        self.task_type = task_type
+        self.tone_pattern = tone_pattern
+        self.prompt = prompt
+        self.runs = runs
+        self.timestamp = timestamp
+        self.model = model
+        self.statistics = statistics
+
+    def extracted_values(self) -> List[Any]:
+        """抽出できた値のリスト"""
+        return [run.extracted_value for run in self.runs if run.extracted_value is not None]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """results.json の results[*] の形式に変換する"""
+        return {
+            "task_name": self.task_name,
+            "task_type": self.task_type,
+            "tone_pattern": self.tone_pattern,
+            "prompt": self.prompt,
+            "runs": [run.to_dict() for run in self.runs],
+            "runs_count": len(self.runs),
+            "timestamp": self.timestamp,
+            "model": self.model,
+            "statistics": self.statistics
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CellResult":
+        """results.json の results[*] の形式から復元する"""
+        return cls(
+            data["task_name"],
+            data["task_type"],
+            data["tone_pattern"],
+            data["prompt"],
+            [RunRecord.from_dict(run) for run in data.get("runs", [])],
+            data.get("timestamp", ""),
+            data.get("model", ""),
+            data.get("statistics", {}),
+        )
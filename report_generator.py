@@ -6,10 +6,12 @@ HTMLレポート生成モジュール
 
 import json
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from similarity import analyze_text_results, has_text_metrics
+from storage import read_json, write_text
 
 
-def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any], tone_patterns: Dict[str, str], filename: str = "docs/index.html"):
+def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any], tone_patterns: Dict[str, str], filename: str = "docs/index.html", cost_summary: Optional[Dict[str, Any]] = None):
     """
     HTMLレポートを生成
     """
@@ -380,6 +382,7 @@ def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any],
         <div class="sidebar-title">実験レポート</div>
         <a href="#header" class="nav-link">概要</a>
         {''.join([f'<a href="#task-{i}" class="nav-link">{name}</a>' for i, name in enumerate(tasks_data.keys())])}
+        {'<a href="#cost" class="nav-link">コスト</a>' if cost_summary else ''}
     </nav>
 
     <!-- Main Content -->
@@ -390,11 +393,14 @@ def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any],
                 <div class="meta-item"><span>📅</span> {datetime.now().strftime('%Y年%m月%d日 %H:%M')}</div>
                 <div class="meta-item"><span>🤖</span> {config["model"]}</div>
                 <div class="meta-item"><span>📊</span> Total Tasks: {len(tasks_data)}</div>
+                {f'<div class="meta-item"><span>💰</span> ${cost_summary["total_usd"]:.4f}</div>' if cost_summary else ''}
             </div>
         </div>
 
         {generate_task_sections(tasks_data)}
 
+        {generate_cost_section(cost_summary) if cost_summary else ''}
+
     </main>
 
     <script>
@@ -454,6 +460,7 @@ def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any],
                     const tokens = runData && runData.usage ? runData.usage.total_tokens : 'N/A';
                     const time = runData ? runData.execution_time_seconds.toFixed(2) : 'N/A';
                     const length = runData ? runData.response_length : 'N/A';
+                    const dispatchedAt = runData && runData.dispatched_at ? runData.dispatched_at.slice(11, 19) : null;
 
                     container.innerHTML = `
                         <div class="prompt-text"><strong>プロンプト:</strong><br>${{escapeHtml(result.prompt)}}</div>
@@ -462,6 +469,7 @@ def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any],
                             <span class="stats-tag">文字数: ${{length}}</span>
                             <span class="stats-tag">時間: ${{time}}s</span>
                             <span class="stats-tag">トークン: ${{tokens}}</span>
+                            ${{dispatchedAt ? `<span class="stats-tag">呼び出し: ${{dispatchedAt}}</span>` : ''}}
                         </div>
                         
                         <div class="response-text">${{escapeHtml(responseContent)}}</div>
@@ -566,8 +574,7 @@ def generate_html_report(results: List[Dict[str, Any]], config: Dict[str, Any],
 </body>
 </html>
 """
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(html)
+    write_text(filename, html)
     print(f"HTMLレポートを {filename} に保存しました")
 
 def generate_task_sections(tasks_data):
@@ -584,9 +591,13 @@ def generate_task_sections(tasks_data):
             html += generate_prompt_list(results)
         elif task_type == "question":
             html += generate_text_table(results)
+            html += generate_similarity_section(analyze_text_results(results).get(task_name))
             html += generate_prompt_list(results)
         else:
             html += generate_comparison_view(i, results)
+            # 登録時に text_metrics を指定したタスクタイプにも類似度を載せる
+            if has_text_metrics(task_type):
+                html += generate_similarity_section(analyze_text_results(results).get(task_name))
             
         html += '</section>'
             
@@ -607,6 +618,7 @@ def generate_stats_table(results):
                 <th class="sortable cell-number" data-col="3" data-type="number" onclick="sortTable('{table_id}', 3, 'number')">最小</th>
                 <th class="sortable cell-number" data-col="4" data-type="number" onclick="sortTable('{table_id}', 4, 'number')">最大</th>
                 <th class="sortable cell-number" data-col="5" data-type="number" onclick="sortTable('{table_id}', 5, 'number')">サンプル数</th>
+                <th class="sortable cell-number" data-col="6" data-type="string" onclick="sortTable('{table_id}', 6, 'string')">呼び出し時刻（中央）</th>
             </tr>
         </thead>
         <tbody>
@@ -628,6 +640,7 @@ def generate_stats_table(results):
             <td class="cell-number">{min_val}</td>
             <td class="cell-number">{max_val}</td>
             <td class="cell-number">{count}</td>
+            <td class="cell-number">{median_dispatch_time(r.get("runs", []))}</td>
         </tr>
         """
 
@@ -635,11 +648,18 @@ def generate_stats_table(results):
         </tbody>
     </table>
     <div style="margin-top: 1rem; color: #64748b; font-size: 0.9rem;">
-        ※ 数値は実験で抽出された誤字脱字の指摘数を示しています。ヘッダーをクリックでソートできます。
+        ※ 数値は実験で抽出された誤字脱字の指摘数を示しています。呼び出し時刻は各口調のランを送った時刻の中央値です。ヘッダーをクリックでソートできます。
     </div>
     """
     return html
 
+def median_dispatch_time(runs):
+    """ランの呼び出し時刻の中央値を HH:MM:SS で返す（記録がなければ "-"）"""
+    times = sorted(run["dispatched_at"] for run in runs if run.get("dispatched_at"))
+    if not times:
+        return "-"
+    return times[(len(times) - 1) // 2][11:19]
+
 def generate_text_table(results):
     html = """
     <table class="text-table">
@@ -670,6 +690,72 @@ def generate_text_table(results):
     """
     return html
 
+def generate_similarity_section(analysis):
+    if not analysis:
+        return ""
+
+    def fmt(value, spec=".2f"):
+        return "-" if value is None else format(value, spec)
+
+    labels = analysis["similarity"]["labels"]
+    html = '<h3>応答の長さと多様性</h3>'
+    html += """
+    <table class="stats-table">
+        <thead>
+            <tr>
+                <th style="width: 20%;">口調パターン</th>
+                <th class="cell-number">応答数</th>
+                <th class="cell-number">文字数（平均）</th>
+                <th class="cell-number">文字数（中央値）</th>
+                <th class="cell-number">文字数（最小/最大）</th>
+                <th class="cell-number">distinct-1</th>
+                <th class="cell-number">distinct-2</th>
+            </tr>
+        </thead>
+        <tbody>
+    """
+    for tone, metrics in analysis["tones"].items():
+        length = metrics["length"]
+        html += f"""
+        <tr>
+            <td><strong>{tone}</strong></td>
+            <td class="cell-number">{length["count"]}</td>
+            <td class="cell-number">{fmt(length.get("mean"), ".1f")}</td>
+            <td class="cell-number">{fmt(length.get("median"), ".1f")}</td>
+            <td class="cell-number">{length.get("min", "-")} / {length.get("max", "-")}</td>
+            <td class="cell-number">{fmt(metrics["distinct_1"], ".3f")}</td>
+            <td class="cell-number">{fmt(metrics["distinct_2"], ".3f")}</td>
+        </tr>
+        """
+    html += "</tbody></table>"
+
+    html += '<h3>口調間の類似度</h3>'
+    html += f"""
+    <table class="stats-table">
+        <thead>
+            <tr>
+                <th style="width: 20%;"></th>
+                {''.join(f'<th class="cell-number">{label}</th>' for label in labels)}
+            </tr>
+        </thead>
+        <tbody>
+    """
+    for label, row in zip(labels, analysis["similarity"]["matrix"]):
+        html += f"<tr><td><strong>{label}</strong></td>"
+        for value in row:
+            # 類似度が高いほど濃く表示する
+            style = f' style="background-color: rgba(59, 130, 246, {value * 0.6:.2f});"' if value is not None else ""
+            html += f'<td class="cell-number"{style}>{fmt(value, ".3f")}</td>'
+        html += "</tr>"
+    html += """
+        </tbody>
+    </table>
+    <div style="margin-top: 1rem; color: #64748b; font-size: 0.9rem;">
+        ※ 文字2〜3-gramのTF-IDFベクトルによる平均コサイン類似度です。対角成分は同じ口調の別の応答同士の平均です。
+    </div>
+    """
+    return html
+
 def generate_prompt_list(results):
     html = """
     <details class="prompt-details">
@@ -720,16 +806,62 @@ def generate_comparison_view(index, results):
     </div>
     """
 
+def generate_cost_section(cost_summary):
+    tones = list(cost_summary.get("by_tone", {}).keys())
+    cells = {(c["task_name"], c["tone_pattern"]): c for c in cost_summary.get("cells", [])}
+
+    html = '<section id="cost" class="task-section">'
+    html += '<h2>コスト</h2>'
+    html += f"""
+    <table class="stats-table">
+        <thead>
+            <tr>
+                <th style="width: 20%;">タスク</th>
+                {''.join(f'<th class="cell-number">{tone}</th>' for tone in tones)}
+                <th class="cell-number">合計</th>
+            </tr>
+        </thead>
+        <tbody>
+    """
+
+    for task_name, task_total in cost_summary.get("by_task", {}).items():
+        html += f"<tr><td><strong>{task_name}</strong></td>"
+        for tone in tones:
+            cell = cells.get((task_name, tone))
+            html += f'<td class="cell-number">{"$%.4f" % cell["cost_usd"] if cell else "-"}</td>'
+        html += f'<td class="cell-number">${task_total:.4f}</td></tr>'
+
+    html += f"""
+        <tr>
+            <td><strong>合計</strong></td>
+            {''.join(f'<td class="cell-number">${cost:.4f}</td>' for cost in cost_summary.get("by_tone", {}).values())}
+            <td class="cell-number"><strong>${cost_summary.get("total_usd", 0):.4f}</strong></td>
+        </tr>
+        </tbody>
+    </table>
+    """
+
+    projected = cost_summary.get("projected")
+    html += f"""
+    <div style="margin-top: 1rem; color: #64748b; font-size: 0.9rem;">
+        ※ 入力 {cost_summary.get("input_tokens", 0):,} トークン / 出力 {cost_summary.get("output_tokens", 0):,} トークン
+        {f'（見積もり: ${projected["cost_usd"]:.4f}）' if projected else ''}
+    </div>
+    """
+    html += '</section>'
+    return html
+
 def escape_html_py(text):
     if not text:
         return ""
     return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;").replace("'", "&#039;")
 
 
-if __name__ == "__main__":
-    # 既存のresults.jsonからHTMLレポートを生成
-    with open("output/results.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
+def generate_report_from_file(results_file: str = "output/results.json", filename: str = "docs/index.html"):
+    """
+    既存の結果ファイルからHTMLレポートを生成
+    """
+    data = read_json(results_file)
 
     # 設定情報を復元
     config = {
@@ -741,5 +873,10 @@ if __name__ == "__main__":
     tone_patterns = {pattern: pattern for pattern in data["experiment_info"]["tone_patterns"]}
 
     # HTMLレポート生成
-    generate_html_report(data["results"], config, tone_patterns)
+    generate_html_report(data["results"], config, tone_patterns, filename, cost_summary=data["experiment_info"].get("cost"))
+
+
+if __name__ == "__main__":
+    # 既存のresults.jsonからHTMLレポートを生成
+    generate_report_from_file()
     print("HTMLレポートが生成されました。docs/index.html をブラウザで開いてください。")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+スケジューラモジュール
+タスク×口調×ランの実行順を決め（時間による変動が口調と交絡しないようにする）、
+プリフライトで数えた入力トークン数で送信のペースを決める
+"""
+
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 実行順
+#   sequential:     セルごとに全ランを続けて実行する（従来の順序）
+#   interleaved:    ラン番号ごとに全セルを順番に回す
+#   random:         全ランを乱数で並べ替える
+#   blocked_random: ラン番号ごとに全セルを回し、各周の中の順序を乱数で並べ替える
+ORDERS = ("sequential", "interleaved", "random", "blocked_random")
+DEFAULT_ORDER = "blocked_random"
+
+
+def resolve_schedule(options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    スケジュール設定を確定する（シードが未指定なら生成して記録できるようにする）
+
+    Args:
+        options: スケジュール設定（config.json の "schedule"）
+
+    Returns:
+        order, seed, tokens_per_minute を含む設定
+
+    Raises:
+        ValueError: 未知の実行順の場合
+    """
+    options = options or {}
+    order = options.get("order", DEFAULT_ORDER)
+    if order not in ORDERS:
+        raise ValueError(f"Unknown schedule order: {order}")
+    seed = options.get("seed")
+    if seed is None and order in ("random", "blocked_random"):
+        seed = random.SystemRandom().randrange(2 ** 32)
+    return {"order": order, "seed": seed, "tokens_per_minute": options.get("tokens_per_minute")}
+
+
+def schedule_runs(cells: List[Dict[str, Any]], schedule: Dict[str, Any]) -> List[Tuple[int, int]]:
+    """
+    全ランの実行順を決める
+
+    Args:
+        cells: plan_cells が返すセルのリスト
+        schedule: resolve_schedule が返す設定
+
+    Returns:
+        (セルの番号, ラン番号) のリスト（実行順）
+    """
+    order = schedule["order"]
+    rng = random.Random(schedule.get("seed"))
+
+    if order == "sequential":
+        return [(cell_index, run) for cell_index, cell in enumerate(cells) for run in cell["run_numbers"]]
+
+    # 各セルの k 番目に実行するランを k 周目にまとめる
+    rounds = []
+    for position in range(max((len(cell["run_numbers"]) for cell in cells), default=0)):
+        rounds.append([
+            (cell_index, cell["run_numbers"][position])
+            for cell_index, cell in enumerate(cells)
+            if position < len(cell["run_numbers"])
+        ])
+
+    if order == "interleaved":
+        return [item for round_items in rounds for item in round_items]
+    if order == "blocked_random":
+        for round_items in rounds:
+            rng.shuffle(round_items)
+        return [item for round_items in rounds for item in round_items]
+
+    items = [item for round_items in rounds for item in round_items]
+    rng.shuffle(items)
+    return items
+
+
+class TokenRateLimiter:
+    """
+    入力トークン数による送信ペースの制限（トークンバケット）
+
+    呼び出しを送る前に、プリフライトで数えたそのランの入力トークン数を確保する。
+    1分あたり tokens_per_minute まで送れ、使い切ったら補充されるまで待つ。
+    実行順は変えず、送る時刻だけを遅らせる。
+    """
+
+    def __init__(self, tokens_per_minute: int, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            tokens_per_minute: 1分あたりに送れる入力トークン数
+            clock: 時刻を返す関数
+            sleep: 待機関数
+        """
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self._available = float(tokens_per_minute)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+
+    def acquire(self, tokens: int) -> float:
+        """
+        入力トークンを確保する（足りなければ補充されるまで待つ）
+
+        上限より大きいランは、バケットが満杯になるのを待って送る。
+
+        Args:
+            tokens: このランの入力トークン数
+
+        Returns:
+            待機した秒数
+        """
+        needed = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            now = self._clock()
+            self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._available >= needed:
+                self._available -= tokens
+                return waited
+            delay = (needed - self._available) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+def rate_limiter(schedule: Dict[str, Any]) -> Optional[TokenRateLimiter]:
+    """スケジュール設定に tokens_per_minute があれば TokenRateLimiter を返す"""
+    if not schedule.get("tokens_per_minute"):
+        return None
+    return TokenRateLimiter(schedule["tokens_per_minute"])
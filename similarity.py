@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+応答テキストの類似度・多様性の分析モジュール
+文字n-gramのTF-IDFで口調間の類似度を計算し、応答の長さと多様性を集計する（API呼び出しなし）
+"""
+
+import hashlib
+import json
+import math
+import statistics
+import sys
+from collections import Counter, OrderedDict, defaultdict
+from itertools import chain
+from operator import mul
+from typing import Any, Dict, Iterable, List, Optional
+
+from storage import read_json
+from task_types import get_task_type
+
+# TF-IDF に使う文字n-gramの長さ
+NGRAM_SIZES = (2, 3)
+
+# n-gramキャッシュに保持する最大件数（古いものから捨てる）
+NGRAM_CACHE_SIZE = 65536
+
+# (n, 応答テキストのハッシュ) -> 文字n-gramの出現回数（最近使った NGRAM_CACHE_SIZE 件）
+_ngram_cache: "OrderedDict[tuple, Counter]" = OrderedDict()
+
+
+def response_hash(text: str) -> str:
+    """応答テキストのハッシュ（n-gramキャッシュのキー）"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def char_ngrams(text: str, n: int) -> Counter:
+    """
+    空白を除いた文字n-gramの出現回数を数える（最近数えた応答は再計算しない）
+
+    Args:
+        text: 応答テキスト
+        n: n-gramの長さ
+
+    Returns:
+        n-gram -> 出現回数
+    """
+    key = (n, response_hash(text))
+    counts = _ngram_cache.get(key)
+    if counts is not None:
+        _ngram_cache.move_to_end(key)
+        return counts
+    chars = "".join(text.split())
+    counts = Counter([chars[i:i + n] for i in range(len(chars) - n + 1)])
+    _ngram_cache[key] = counts
+    if len(_ngram_cache) > NGRAM_CACHE_SIZE:
+        _ngram_cache.popitem(last=False)
+    return counts
+
+
+def term_counts(text: str) -> Dict[str, int]:
+    """TF-IDF に使う文字n-gram（NGRAM_SIZES）の出現回数"""
+    counts = {}
+    for n in NGRAM_SIZES:
+        counts.update(char_ngrams(text, n))
+    return counts
+
+
+def _idf(counts: List[Dict[str, int]]) -> Dict[str, float]:
+    df = Counter()
+    for count in counts:
+        df.update(count.keys())
+    n = len(counts)
+    return {term: math.log((1 + n) / (1 + freq)) + 1 for term, freq in df.items()}
+
+
+def _dot(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+
+def _group_dots(groups: List[List[Dict[str, int]]]) -> List[List[float]]:
+    """グループごとの正規化TF-IDFベクトルの和を作り、その内積の行列を返す（純Python）"""
+    idf = _idf([count for counts in groups for count in counts])
+
+    # 正規化ベクトルの和 = idf × Σ(tf / ノルム) なので、idf は最後に1回だけ掛ける
+    sums = []
+    for counts in groups:
+        total = {}
+        get = total.get
+        for count in counts:
+            norm = math.hypot(*map(mul, count.values(), map(idf.__getitem__, count)))
+            if not norm:
+                continue
+            for term, tf in count.items():
+                total[term] = get(term, 0.0) + tf / norm
+        sums.append({term: weight * idf[term] for term, weight in total.items()})
+    return [[_dot(a, b) for b in sums] for a in sums]
+
+
+def _group_dots_numpy(np: Any, groups: List[List[Dict[str, int]]]) -> List[List[float]]:
+    """_group_dots と同じ計算を numpy でまとめて行う"""
+    docs = [count for counts in groups for count in counts]
+    vocab = {term: i for i, term in enumerate(set().union(*docs))}
+    lengths = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs))
+    size = int(lengths.sum())
+    ids = np.fromiter(chain.from_iterable(map(vocab.__getitem__, count) for count in docs), dtype=np.int64, count=size)
+    tfs = np.fromiter(chain.from_iterable(count.values() for count in docs), dtype=np.float64, count=size)
+
+    # 各応答のキーは重複しないので、出現回数がそのまま文書頻度になる
+    df = np.bincount(ids, minlength=len(vocab))
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+    weights = tfs * idf[ids]
+    doc_index = np.repeat(np.arange(len(docs)), lengths)
+    weights /= np.sqrt(np.bincount(doc_index, weights * weights, minlength=len(docs)))[doc_index]
+
+    # グループの応答は連続しているので、区間ごとに足し合わせる
+    bounds = np.concatenate(([0], np.cumsum(lengths)))[np.cumsum([0] + [len(counts) for counts in groups])]
+    sums = np.stack([np.bincount(ids[start:stop], weights[start:stop], minlength=len(vocab)) for start, stop in zip(bounds[:-1], bounds[1:])])
+    return (sums @ sums.T).tolist()
+
+
+def similarity_matrix(groups: Dict[str, List[str]]) -> Dict[str, Any]:
+    """
+    グループ（口調）間の平均コサイン類似度の行列を作る
+
+    各グループの正規化ベクトルの和を使うので、応答のペアを総当たりせずに
+    グループ間の平均類似度が求まる（対角成分は同じグループ内の別の応答同士の平均）。
+    n-gramを持たない応答（1文字など）は類似度を定義できないので平均から除く。
+    numpy がインストールされていれば使い、なければ純Pythonで計算する。
+
+    Args:
+        groups: グループ名 -> 応答テキストのリスト
+
+    Returns:
+        labels（グループ名）と matrix（平均類似度、計算できない場合は None）
+    """
+    labels = list(groups)
+    counts = [[term_counts(text) for text in groups[label]] for label in labels]
+    try:
+        import numpy
+    except ImportError:
+        dots = _group_dots(counts)
+    else:
+        dots = _group_dots_numpy(numpy, counts)
+
+    # n-gramのない応答（1文字や空白のみ）はベクトルが0なので、どちらの計算でも和に入らない。
+    # 平均の分母と自分自身との類似度の補正にも数えない
+    sizes = [sum(1 for count in group if count) for group in counts]
+    matrix = []
+    for i, size_i in enumerate(sizes):
+        row = []
+        for j, size_j in enumerate(sizes):
+            if i != j:
+                row.append(dots[i][j] / (size_i * size_j) if size_i and size_j else None)
+            elif size_i > 1:
+                # 自分自身との類似度（各1.0）を除く（丸め誤差で負にならないようにする）
+                row.append(max(0.0, (dots[i][i] - size_i) / (size_i * (size_i - 1))))
+            else:
+                row.append(None)
+        matrix.append(row)
+    return {"labels": labels, "matrix": matrix}
+
+
+def length_distribution(lengths: List[int]) -> Dict[str, Any]:
+    """
+    応答の長さの分布を集計する
+
+    Args:
+        lengths: 文字数のリスト
+
+    Returns:
+        件数・平均・中央値・標準偏差・最小・最大
+    """
+    if not lengths:
+        return {"count": 0}
+    return {
+        "count": len(lengths),
+        "mean": statistics.mean(lengths),
+        "median": statistics.median(lengths),
+        "stdev": statistics.stdev(lengths) if len(lengths) >= 2 else None,
+        "min": min(lengths),
+        "max": max(lengths),
+    }
+
+
+def distinct_n(texts: Iterable[str], n: int) -> Optional[float]:
+    """
+    文字n-gramの多様性（異なるn-gramの数 / n-gramの総数）
+
+    Args:
+        texts: 応答テキスト
+        n: n-gramの長さ
+
+    Returns:
+        多様性（n-gramがなければ None）
+    """
+    counts = [char_ngrams(text, n) for text in texts]
+    total = sum(sum(count.values()) for count in counts)
+    return len(set().union(*counts)) / total if total else None
+
+
+def has_text_metrics(task_type: Optional[str]) -> bool:
+    """タスクタイプが text_metrics 付きで登録されているかどうか（未登録なら False）"""
+    try:
+        return get_task_type(task_type).text_metrics
+    except ValueError:
+        return False
+
+
+def analyze_text_results(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    テキスト回答のタスク（text_metrics 付きで登録したタスクタイプ）について、
+    口調ごとの長さ・多様性と口調間の類似度をまとめて計算する
+
+    Args:
+        results: results.json の results
+
+    Returns:
+        タスク名 -> {"tones": 口調ごとの指標, "similarity": 類似度行列}
+    """
+    grouped = defaultdict(dict)
+    for result in results:
+        if not has_text_metrics(result.get("task_type")):
+            continue
+        texts = [run["response"] for run in result.get("runs", []) if run.get("success") and run.get("response")]
+        grouped[result["task_name"]].setdefault(result["tone_pattern"], []).extend(texts)
+
+    analysis = {}
+    for task_name, groups in grouped.items():
+        analysis[task_name] = {
+            "tones": {
+                tone: {
+                    "length": length_distribution([len(text) for text in texts]),
+                    "distinct_1": distinct_n(texts, 1),
+                    "distinct_2": distinct_n(texts, 2),
+                }
+                for tone, texts in groups.items()
+            },
+            "similarity": similarity_matrix(groups),
+        }
+    return analysis
+
+
+if __name__ == "__main__":
+    # 使い方: python similarity.py [output/results.json]
+    results_file = sys.argv[1] if len(sys.argv) > 1 else "output/results.json"
+    data = read_json(results_file)
+    print(json.dumps(analyze_text_results(data["results"]), ensure_ascii=False, indent=2))
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+ファイル保存モジュール
+結果とレポートを一時ファイルに書いてから fsync して置き換え、書き込み途中で落ちても既存のファイルを壊さない
+"""
+
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Iterator, Tuple
+
+# 拡張子ごとの圧縮形式
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+# iter_json が要素ごとに分けて変換する深さ
+STREAM_DEPTH = 2
+
+# 64ビットに収まらない可能性のある整数（20桁以上の数字の並び）
+_LONG_DIGITS = re.compile(rb"\d{20,}")
+
+
+def compression_for(path: str) -> Any:
+    """パスの拡張子から圧縮形式を返す（非圧縮なら None）"""
+    return COMPRESSIONS.get(os.path.splitext(path)[1])
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd 圧縮には zstandard が必要です（pip install zstandard）") from None
+    return zstandard
+
+
+def _fsync_directory(directory: str):
+    # 置き換え（rename）自体をディスクに残す（ディレクトリを開けない環境では省略）
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_open(path: str) -> Iterator[BinaryIO]:
+    """
+    原子的に書き込むためのバイナリストリームを開く
+
+    同じディレクトリの一時ファイルに書き、閉じる前に fsync してから path に置き換える。
+    例外が起きた場合は一時ファイルを削除し、既存のファイルはそのまま残る。
+    拡張子が .gz / .zst なら圧縮しながら書き込む。
+
+    Args:
+        path: 保存先のパス
+
+    Yields:
+        書き込み用のバイナリストリーム
+    """
+    # 保存するときだけ読み込む（--dry-run の起動を速くする）
+    import gzip
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            compression = compression_for(path)
+            if compression == "gzip":
+                with gzip.GzipFile(filename=os.path.basename(path), mode="wb", fileobj=raw, mtime=0) as stream:
+                    yield stream
+            elif compression == "zstd":
+                with _zstd().ZstdCompressor().stream_writer(raw, closefd=False) as stream:
+                    yield stream
+            else:
+                yield raw
+            raw.flush()
+            os.fsync(raw.fileno())
+        # mkstemp は 0600 で作るので、既存のファイル（なければ通常のファイル）と同じ権限にする
+        if os.path.exists(path):
+            mode = os.stat(path).st_mode & 0o777
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def write_text(path: str, text: str):
+    """
+    テキストを原子的に保存する
+
+    Args:
+        path: 保存先のパス
+        text: 保存する文字列
+    """
+    with atomic_open(path) as f:
+        f.write(text.encode("utf-8"))
+
+
+def dumps_json(data: Any, compact: bool = False) -> bytes:
+    """
+    JSONをUTF-8のバイト列にする（orjson がインストールされていれば使う）
+
+    orjson が扱えない値（64ビットを超える整数など）を含む場合は標準の json で変換する。
+
+    Args:
+        data: 保存するデータ
+        compact: インデントなしで出力する
+
+    Returns:
+        JSONのバイト列
+    """
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        try:
+            return orjson.dumps(data, option=0 if compact else orjson.OPT_INDENT_2)
+        except TypeError:
+            pass
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def iter_json(data: Any, compact: bool = False, level: int = 0) -> Iterator[bytes]:
+    """
+    JSONを少しずつバイト列にする（出力は dumps_json と同じ）
+
+    最上位のオブジェクトと、その直下のオブジェクト・配列は要素ごとに変換するので、
+    結果全体のバイト列を一度にメモリに作らない（results の各セルが1回の変換単位になる）。
+
+    Args:
+        data: 保存するデータ
+        compact: インデントなしで出力する
+        level: 入れ子の深さ（インデントに使う）
+
+    Yields:
+        JSONのバイト列の断片
+    """
+    streamable = isinstance(data, list) or (isinstance(data, dict) and all(isinstance(key, str) for key in data))
+    if level >= STREAM_DEPTH or not data or not streamable:
+        chunk = dumps_json(data, compact)
+        # JSONの文字列に改行はそのまま現れないので、改行の後ろに外側のインデントを足せばよい
+        yield chunk if compact or not level else chunk.replace(b"\n", b"\n" + b"  " * level)
+        return
+
+    inner = b"" if compact else b"\n" + b"  " * (level + 1)
+    outer = b"" if compact else b"\n" + b"  " * level
+    if isinstance(data, dict):
+        colon = b":" if compact else b": "
+        yield b"{"
+        for i, (key, value) in enumerate(data.items()):
+            yield (b"," if i else b"") + inner + dumps_json(key) + colon
+            yield from iter_json(value, compact, level + 1)
+        yield outer + b"}"
+    else:
+        yield b"["
+        for i, value in enumerate(data):
+            yield (b"," if i else b"") + inner
+            yield from iter_json(value, compact, level + 1)
+        yield outer + b"]"
+
+
+def write_json(path: str, data: Any, compact: bool = False):
+    """
+    JSONを原子的に保存する（拡張子が .gz / .zst なら圧縮する）
+
+    要素ごとに変換しながら書き込む（iter_json）。
+
+    Args:
+        path: 保存先のパス
+        data: 保存するデータ
+        compact: インデントなしで出力する
+    """
+    with atomic_open(path) as f:
+        for chunk in iter_json(data, compact):
+            f.write(chunk)
+
+
+def _read_bytes(path: str) -> bytes:
+    compression = compression_for(path)
+    if compression == "gzip":
+        import gzip
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    if compression == "zstd":
+        with open(path, "rb") as f, _zstd().ZstdDecompressor().stream_reader(f) as reader:
+            return reader.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _loads_json(raw: bytes) -> Any:
+    try:
+        import orjson
+    except ImportError:
+        return json.loads(raw.decode("utf-8"))
+    # orjson は64ビットを超える整数を浮動小数点数にしてしまうので、長い数字の並びがあれば標準の json で読む
+    if _LONG_DIGITS.search(raw):
+        return json.loads(raw.decode("utf-8"))
+    return orjson.loads(raw)
+
+
+def read_json(path: str) -> Any:
+    """
+    JSONファイルを読み込む（拡張子が .gz / .zst なら展開する、orjson がインストールされていれば使う）
+
+    Args:
+        path: ファイルのパス
+
+    Returns:
+        読み込んだデータ
+    """
+    return _loads_json(_read_bytes(path))
+
+
+def read_json_layout(path: str) -> Tuple[Any, bool]:
+    """
+    JSONファイルを読み込み、インデントなしで保存されていたかどうかも返す（同じ形式で書き戻すため）
+
+    Args:
+        path: ファイルのパス
+
+    Returns:
+        (読み込んだデータ, インデントなしかどうか)
+    """
+    raw = _read_bytes(path)
+    # インデント付きの出力は "{" か "[" の直後で改行する
+    return _loads_json(raw), raw[1:2] != b"\n"
+
+
+if __name__ == "__main__":
+    # 保存と読み込みの確認: python storage.py
+    import shutil
+    import tempfile
+
+    sample = {
+        "experiment_info": {"model": "sample", "cost": {}},
+        "results": [
+            # 応答から64ビットを超える整数が抽出されることがある（orjson では変換できない）
+            {"task_name": "誤字", "runs": [{"extracted_value": 123456789012345678901234, "response": "改行\nを含む"}], "statistics": {}},
+            {"task_name": "質問", "runs": [], "statistics": {"values": [1, 2.5, None]}},
+        ],
+    }
+    directory = tempfile.mkdtemp()
+    try:
+        for name in ("results.json", "results.json.gz"):
+            for compact in (False, True):
+                path = os.path.join(directory, name)
+                write_json(path, sample, compact)
+                assert read_json(path) == sample, (name, compact)
+                assert read_json_layout(path) == (sample, compact), (name, compact)
+                assert b"".join(iter_json(sample, compact)) == dumps_json(sample, compact), compact
+                assert json.loads(b"".join(iter_json(sample, compact))) == sample, compact
+        # 一時ファイルが残っていない
+        assert sorted(os.listdir(directory)) == ["results.json", "results.json.gz"]
+    finally:
+        shutil.rmtree(directory)
+    print("OK")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+タスクタイプのレジストリ
+タスクタイプごとにプロンプトテンプレート・応答パーサ・統計集計を登録する
+"""
+
+import math
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from number_parser import extract_number
+
+
+def numeric_statistics(values: List[Any]) -> Dict[str, Any]:
+    """
+    抽出された数値の統計情報を計算する
+
+    Args:
+        values: 抽出された数値のリスト（Noneは除外される）
+
+    Returns:
+        平均値・標準偏差・最小/最大値を含む辞書
+    """
+    # statistics は読み込みが重い（fractions, decimal）ので、集計するときだけ読み込む
+    import statistics
+
+    values = [v for v in values if v is not None]
+    stats = {}
+    if values:
+        stats["mean"] = statistics.mean(values)
+        stats["values"] = values
+        if len(values) >= 2:
+            stats["stdev"] = statistics.stdev(values)
+            stats["min"] = min(values)
+            stats["max"] = max(values)
+    return stats
+
+
+class RunningMoments:
+    """
+    平均・分散・最小/最大の逐次集計（Welford法）
+
+    既存の統計情報から復元して新しい値を加えられるので、
+    追加したランだけで統計を更新できる。
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def from_statistics(cls, stats: Dict[str, Any]) -> "RunningMoments":
+        """
+        numeric_statistics の出力から復元する
+
+        Args:
+            stats: mean, values, stdev を含む統計情報
+
+        Returns:
+            復元した集計
+        """
+        moments = cls()
+        values = stats.get("values") or []
+        if values:
+            moments.count = len(values)
+            moments.mean = stats["mean"]
+            moments.m2 = stats.get("stdev", 0.0) ** 2 * (moments.count - 1)
+            moments.min = stats.get("min", min(values))
+            moments.max = stats.get("max", max(values))
+        return moments
+
+    def add(self, value: float):
+        """値を1つ加える"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_statistics(self, values: List[Any]) -> Dict[str, Any]:
+        """
+        numeric_statistics と同じ形式の統計情報にする
+
+        Args:
+            values: 集計に含めた値のリスト（"values" にそのまま入る）
+
+        Returns:
+            平均値・標準偏差・最小/最大値を含む辞書
+        """
+        stats = {}
+        if self.count:
+            stats["mean"] = self.mean
+            stats["values"] = values
+            if self.count >= 2:
+                stats["stdev"] = math.sqrt(self.m2 / (self.count - 1))
+                stats["min"] = self.min
+                stats["max"] = self.max
+        return stats
+
+
+def merge_numeric_statistics(stats: Dict[str, Any], new_values: List[Any]) -> Dict[str, Any]:
+    """
+    既存の統計情報に新しい値を加える（既存の値は走査し直さない）
+
+    Args:
+        stats: numeric_statistics の出力
+        new_values: 追加する値のリスト（Noneは除外される）
+
+    Returns:
+        更新した統計情報
+    """
+    moments = RunningMoments.from_statistics(stats)
+    new_values = [v for v in new_values if v is not None]
+    for value in new_values:
+        moments.add(value)
+    return moments.to_statistics(list(stats.get("values") or []) + new_values)
+
+
+def no_statistics(values: List[Any]) -> Dict[str, Any]:
+    """統計を取らないタスク用の集計関数"""
+    return {}
+
+
+def sum_values(values: List[Any]) -> Any:
+    """
+    チャンクごとの抽出値を合計する（1つでも抽出できなければNone）
+
+    Args:
+        values: チャンクごとの抽出値のリスト
+
+    Returns:
+        合計値、またはNone
+    """
+    if not values or any(v is None for v in values):
+        return None
+    return sum(values)
+
+
+class TaskType:
+    """
+    タスクタイプの定義
+
+    テンプレートは登録時に一度だけ解析され、描画時は文字列の連結のみを行う。
+    テンプレート内では {tone} と {content} が使用できる。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        template: str,
+        parser: Optional[Callable[[str], Any]] = None,
+        aggregator: Callable[[List[Any]], Dict[str, Any]] = no_statistics,
+        repeat: bool = False,
+        merger: Optional[Callable[[Dict[str, Any], List[Any]], Dict[str, Any]]] = None,
+        combiner: Optional[Callable[[List[Any]], Any]] = None,
+        text_metrics: bool = False,
+    ):
+        """
+        Args:
+            name: タスクタイプ名（config.json の "type"）
+            template: プロンプトテンプレート
+            parser: 応答テキストから値を抽出する関数（不要ならNone）。
+                タスク設定の "parser_options" がキーワード引数として渡される
+            aggregator: 抽出値のリストから統計情報を計算する関数
+            repeat: runs_per_task 回繰り返し実行するかどうか（Falseなら1回）
+            merger: 既存の統計情報に新しい抽出値を加える関数（省略時は全値で aggregator を呼び直す）
+            combiner: チャンクごとの抽出値を1つのランの値にまとめる関数（preflight の on_oversize: "chunk"）。
+                指定したタスクタイプだけコンテンツを分割して実行できる
+            text_metrics: 応答テキストの長さ・多様性・口調間の類似度をレポートに載せるかどうか
+        """
+        self.name = name
+        self.template = template
+        self.parser = parser
+        self.aggregator = aggregator
+        self.repeat = repeat
+        self.merger = merger
+        self.combiner = combiner
+        self.text_metrics = text_metrics
+        self._parts = self._compile(template)
+
+    @staticmethod
+    def _compile(template: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+        parts = []
+        for literal, field, _, _ in Formatter().parse(template):
+            if field is not None and field not in ("tone", "content"):
+                raise ValueError(f"Unknown template field: {{{field}}}")
+            parts.append((literal, field))
+        return tuple(parts)
+
+    def render(self, tone_instruction: str, content: str) -> str:
+        """
+        テンプレートにトーンとコンテンツを埋め込む
+
+        Args:
+            tone_instruction: 口調パターンの指示文
+            content: タスクのコンテンツ
+
+        Returns:
+            完全なプロンプト文字列
+        """
+        values = {"tone": tone_instruction, "content": content}
+        return "".join(literal + (values[field] if field else "") for literal, field in self._parts)
+
+    def parse(self, text: Optional[str], options: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        応答テキストから値を抽出する（パーサ未登録ならNone）
+
+        Args:
+            text: レスポンステキスト
+            options: パーサに渡すオプション（タスク設定の "parser_options"）
+
+        Returns:
+            抽出された値
+        """
+        if self.parser is None or not text:
+            return None
+        return self.parser(text, **(options or {}))
+
+    @property
+    def splittable(self) -> bool:
+        """コンテンツを分割して実行できるかどうか"""
+        return self.combiner is not None
+
+    def combine(self, values: List[Any]) -> Any:
+        """
+        チャンクごとの抽出値を1つのランの値にまとめる
+
+        Args:
+            values: チャンクごとの抽出値のリスト
+
+        Returns:
+            ランの抽出値
+        """
+        return self.combiner(values)
+
+    def merge_statistics(self, stats: Dict[str, Any], old_values: List[Any], new_values: List[Any]) -> Dict[str, Any]:
+        """
+        既存の統計情報に追加したランの抽出値を反映する
+
+        Args:
+            stats: 既存の統計情報
+            old_values: 既存のランの抽出値
+            new_values: 追加したランの抽出値
+
+        Returns:
+            更新した統計情報
+        """
+        if self.merger is None:
+            return self.aggregator(old_values + new_values)
+        return self.merger(stats, new_values)
+
+    def runs_for(self, runs_per_task: int) -> int:
+        """このタスクタイプの実行回数を返す"""
+        return runs_per_task if self.repeat else 1
+
+
+_REGISTRY: Dict[str, TaskType] = {}
+
+
+def register_task_type(task_type: TaskType) -> TaskType:
+    """
+    タスクタイプをレジストリに登録する
+
+    Args:
+        task_type: 登録するタスクタイプ
+
+    Returns:
+        登録したタスクタイプ
+    """
+    _REGISTRY[task_type.name] = task_type
+    _render_cached.cache_clear()
+    return task_type
+
+
+def get_task_type(name: str) -> TaskType:
+    """
+    登録済みのタスクタイプを取得する
+
+    Args:
+        name: タスクタイプ名
+
+    Returns:
+        タスクタイプ
+
+    Raises:
+        ValueError: 未登録のタスクタイプの場合
+    """
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"Unsupported task type: {name}") from None
+
+
+@lru_cache(maxsize=1024)
+def _render_cached(type_name: str, tone_instruction: str, content: str) -> str:
+    return get_task_type(type_name).render(tone_instruction, content)
+
+
+def render_prompt(task: Dict[str, Any], tone_instruction: str) -> str:
+    """
+    タスクと口調からプロンプトを描画する（同じ組み合わせは一度だけ描画される）
+
+    Args:
+        task: タスク情報の辞書
+        tone_instruction: 口調パターンの指示文
+
+    Returns:
+        完全なプロンプト文字列
+    """
+    return _render_cached(task["type"], tone_instruction, task["content"])
+
+
+register_task_type(TaskType(
+    "typo_detection",
+    "{tone}\n\n次の文章に含まれる誤字・脱字・文法ミスの総数を数えてください。回答は数字のみで出力してください（例: 5）。\n{content}",
+    parser=extract_number,
+    aggregator=numeric_statistics,
+    repeat=True,
+    merger=merge_numeric_statistics,
+    # 分割した各部分の誤字の数を足せば全体の数になる
+    combiner=sum_values,
+))
+
+register_task_type(TaskType(
+    "question",
+    "{tone}\n\n大喜利です。以下のお題から、面白い回答を1つだけ答えてください。\n{content}",
+    text_metrics=True,
+))
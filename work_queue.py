@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+ワークキューモジュール
+コーディネータが投入したランをワーカーがリースして実行するためのキュー
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class WorkQueue:
+    """
+    ワークキューのインターフェース
+
+    コーディネータとワーカーはこのメソッドだけを使う。
+    SQLite 以外（Redis など）に差し替える場合はこのクラスを継承して実装する。
+    """
+
+    def enqueue(self, sweep_id: str, payloads: List[Dict[str, Any]]) -> int:
+        """ペイロードを投入し、投入した件数を返す（同じ sweep_id の投入済みアイテムは再投入しない）"""
+        raise NotImplementedError
+
+    def activate(self, sweep_id: str, budget: Optional[Dict[str, Any]] = None, max_attempts: Optional[int] = None) -> int:
+        """
+        スイープを実行中にし、他のスイープの未処理のアイテムを取り消す（取り消した件数を返す）
+
+        budget（max_usd / throttle_usd / throttle_seconds）はワーカーがリースの前に確認する。
+        max_attempts 回リースしても完了しなかったアイテムは再発行せず failed にする。
+        """
+        raise NotImplementedError
+
+    def active_sweep(self) -> Optional[Dict[str, Any]]:
+        """実行中のスイープ（sweep_id, status, 予算, spent_usd）を返す（なければNone）"""
+        raise NotImplementedError
+
+    def sweep(self, sweep_id: str) -> Optional[Dict[str, Any]]:
+        """スイープの状態を返す（なければNone）"""
+        raise NotImplementedError
+
+    def finish(self, sweep_id: str, status: str = "finished") -> int:
+        """スイープを終了し、未処理のアイテムを取り消す（取り消した件数を返す）"""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, lease_seconds: float, sweep_id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        スイープの未処理またはリース切れのアイテムを1件リースし、(アイテムID, ペイロード) を返す
+
+        スイープが実行中でないか、支出が予算の上限に達していればNoneを返す。
+        """
+        raise NotImplementedError
+
+    def reap(self, sweep_id: str) -> int:
+        """リース切れのまま max_attempts 回に達したアイテムを failed にする（failed にした件数を返す）"""
+        raise NotImplementedError
+
+    def renew(self, item_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """リースを延長する（リースを失っていればFalse）"""
+        raise NotImplementedError
+
+    def complete(self, item_id: int, worker_id: str, result: Dict[str, Any], cost_usd: float = 0.0) -> bool:
+        """リース中のアイテムの結果を記録し、支出をスイープに加える（リースを失っていればFalse）"""
+        raise NotImplementedError
+
+    def counts(self, sweep_id: Optional[str] = None) -> Dict[str, int]:
+        """状態ごとの件数を返す（sweep_id を指定するとそのスイープのみ）"""
+        raise NotImplementedError
+
+    def results(self, sweep_id: str) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """スイープの完了したアイテムの (ペイロード, 結果) を投入順に返す"""
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    SQLite を使ったワークキュー
+
+    同じマシン上、または共有ファイルシステム上のプロセス間で使える。
+    リースには期限があり、期限が切れたアイテム（クラッシュしたワーカーの分）は別のワーカーに再発行される。
+    max_attempts 回リースしても完了しないアイテムは failed になり、再発行されない。
+    実行中のスイープは1つだけで、新しいスイープを開始すると古いスイープの未処理のアイテムは取り消される。
+    接続はスレッド間で共有できる（リースの延長を別スレッドから行うため）。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite データベースのパス
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sweep_id TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                UNIQUE (sweep_id, item_key)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sweeps (
+                sweep_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'active',
+                max_usd REAL,
+                throttle_usd REAL,
+                throttle_seconds REAL,
+                spent_usd REAL NOT NULL DEFAULT 0,
+                max_attempts INTEGER,
+                activated_at REAL
+            )
+        """)
+
+    def enqueue(self, sweep_id: str, payloads: List[Dict[str, Any]]) -> int:
+        rows = [
+            (sweep_id, payload["key"], json.dumps(payload, ensure_ascii=False))
+            for payload in payloads
+        ]
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (sweep_id, item_key, payload) VALUES (?, ?, ?)", rows
+            )
+            return self._conn.total_changes - before
+
+    def activate(self, sweep_id: str, budget: Optional[Dict[str, Any]] = None, max_attempts: Optional[int] = None) -> int:
+        budget = budget or {}
+        with self._transaction():
+            cancelled = self._cancel_unfinished("sweep_id != ?", (sweep_id,))
+            self._conn.execute("UPDATE sweeps SET status = 'cancelled' WHERE status = 'active' AND sweep_id != ?", (sweep_id,))
+            # 以前に取り消された（または失敗した）スイープを再開する場合は、アイテムを戻してやり直す
+            self._conn.execute(
+                "UPDATE items SET status = 'pending', attempts = 0 WHERE sweep_id = ? AND status IN ('cancelled', 'failed')", (sweep_id,)
+            )
+            self._conn.execute(
+                """
+                INSERT INTO sweeps (sweep_id, status, max_usd, throttle_usd, throttle_seconds, max_attempts, activated_at)
+                VALUES (?, 'active', ?, ?, ?, ?, ?)
+                ON CONFLICT (sweep_id) DO UPDATE SET
+                    status = 'active', max_usd = excluded.max_usd, throttle_usd = excluded.throttle_usd,
+                    throttle_seconds = excluded.throttle_seconds, max_attempts = excluded.max_attempts,
+                    activated_at = excluded.activated_at
+                """,
+                (sweep_id, budget.get("max_usd"), budget.get("throttle_usd"), budget.get("throttle_seconds"), max_attempts, time.time()),
+            )
+        return cancelled
+
+    def active_sweep(self) -> Optional[Dict[str, Any]]:
+        return self._sweep("status = 'active' ORDER BY activated_at DESC LIMIT 1", ())
+
+    def sweep(self, sweep_id: str) -> Optional[Dict[str, Any]]:
+        return self._sweep("sweep_id = ?", (sweep_id,))
+
+    def finish(self, sweep_id: str, status: str = "finished") -> int:
+        with self._transaction():
+            cancelled = self._cancel_unfinished("sweep_id = ?", (sweep_id,))
+            self._conn.execute("UPDATE sweeps SET status = ? WHERE sweep_id = ?", (status, sweep_id))
+        return cancelled
+
+    def lease(self, worker_id: str, lease_seconds: float, sweep_id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        now = time.time()
+        with self._transaction():
+            sweep = self._conn.execute(
+                "SELECT max_usd, spent_usd FROM sweeps WHERE sweep_id = ? AND status = 'active'", (sweep_id,)
+            ).fetchone()
+            if sweep is None or (sweep[0] is not None and sweep[1] >= sweep[0]):
+                return None
+            # 毎回ワーカーを落とすアイテムを再発行し続けないようにする
+            self._fail_exhausted(sweep_id)
+            row = self._conn.execute(
+                """
+                SELECT id, payload FROM items
+                WHERE sweep_id = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY id LIMIT 1
+                """,
+                (sweep_id, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                """
+                UPDATE items SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = ?
+                """,
+                (worker_id, now + lease_seconds, row[0]),
+            )
+        return row[0], json.loads(row[1])
+
+    def reap(self, sweep_id: str) -> int:
+        with self._transaction():
+            return self._fail_exhausted(sweep_id)
+
+    def renew(self, item_id: int, worker_id: str, lease_seconds: float) -> bool:
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE items SET lease_expires = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (time.time() + lease_seconds, item_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, item_id: int, worker_id: str, result: Dict[str, Any], cost_usd: float = 0.0) -> bool:
+        with self._transaction():
+            cursor = self._conn.execute(
+                """
+                UPDATE items SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (json.dumps(result, ensure_ascii=False), item_id, worker_id),
+            )
+            # 呼び出しは行われたので、結果を破棄する場合も支出には数える
+            self._conn.execute(
+                "UPDATE sweeps SET spent_usd = spent_usd + ? WHERE sweep_id = (SELECT sweep_id FROM items WHERE id = ?)",
+                (cost_usd, item_id),
+            )
+            return cursor.rowcount == 1
+
+    def counts(self, sweep_id: Optional[str] = None) -> Dict[str, int]:
+        counts = {"pending": 0, "leased": 0, "expired": 0, "done": 0, "failed": 0, "cancelled": 0}
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+            """
+                SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'expired' ELSE status END AS state, COUNT(*)
+                FROM items WHERE ? IS NULL OR sweep_id = ?
+                GROUP BY state
+                """,
+            (now, sweep_id, sweep_id),
+            ).fetchall()
+        for state, count in rows:
+            counts[state] = count
+        return counts
+
+    def results(self, sweep_id: str) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload, result FROM items WHERE sweep_id = ? AND status = 'done' ORDER BY id", (sweep_id,)
+            ).fetchall()
+        return [(json.loads(payload), json.loads(result)) for payload, result in rows]
+
+    def _sweep(self, where: str, params: tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT sweep_id, status, max_usd, throttle_usd, throttle_seconds, spent_usd FROM sweeps WHERE {where}", params
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("sweep_id", "status", "max_usd", "throttle_usd", "throttle_seconds", "spent_usd"), row))
+
+    def _fail_exhausted(self, sweep_id: str) -> int:
+        cursor = self._conn.execute(
+            """
+            UPDATE items SET status = 'failed', lease_owner = NULL, lease_expires = NULL
+            WHERE sweep_id = ? AND status = 'leased' AND lease_expires < ?
+                AND attempts >= (SELECT max_attempts FROM sweeps WHERE sweep_id = ?)
+            """,
+            (sweep_id, time.time(), sweep_id),
+        )
+        return cursor.rowcount
+
+    def _cancel_unfinished(self, where: str, params: tuple) -> int:
+        # 未処理とリース切れのアイテムを取り消す（実行中のリースは完了を待つ）
+        cursor = self._conn.execute(
+            f"""
+            UPDATE items SET status = 'cancelled', lease_owner = NULL, lease_expires = NULL
+            WHERE {where} AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+            """,
+            params + (time.time(),),
+        )
+        return cursor.rowcount
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def close(self):
+        self._conn.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE で書き込みロックを取るトランザクション（同じ接続を使うスレッド間でも排他する）"""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+        return False